@@ -17,12 +17,15 @@ repo_root = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(repo_root))
 
 from src.config_loader import UniversalConfig
-from src.utils import find_key, merge_xml_files, log_timing, _load_json_file, filter_xml_by_iaid
+from src.utils import ensure_env_loaded, find_key, merge_xml_files, log_timing, _load_json_file, filter_xml_by_iaid
 from src.utils import load_transfer_register, save_transfer_register, filter_new_records, update_transfer_register_with_records
-from src.utils import insert_ordered, progress_context, get_trans_config
+from src.utils import insert_ordered, progress_context, get_trans_config, dumps_json, loads_json
 from src.transformers import NewlineToPTransformer, YNamingTransformer, ReplicaDataTransformer, convert_to_json
 
 
+# load .env from the working directory before any setting below is read
+ensure_env_loaded()
+
 # load in the environment variables from .env in repo root (done by AWS Lambda automatically)
 if not os.getenv("AWS_LAMBDA_FUNCTION_NAME") and not os.getenv("AWS_EXECUTION_ENV"):
     UniversalConfig(env_file=repo_root / ".env")
@@ -49,6 +52,20 @@ _numeric_level = getattr(logging, _log_level, logging.INFO)
 logging.basicConfig(level=_numeric_level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+
+def _env_worker_count(name: str) -> int:
+    """Read a positive worker count from env var `name`; invalid values fall back to 1."""
+    raw = os.getenv(name, "1").strip() or "1"
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        logger.warning("Invalid %s value %r; using 1", name, raw)
+        return 1
+
+
+# worker processes for XML->JSON record conversion; Lambda has no /dev/shm so keep 1 there
+CONVERT_WORKERS = _env_worker_count("CONVERT_WORKERS")
+
 # S3 client configuration based on run mode
 if run_mode == "local_s3":
     # Local development with S3: requires AWS profile
@@ -202,7 +219,7 @@ def lambda_handler(event, context):
                 logger.info("Loading definitive refs from s3://%s/%s", refs_bucket, s3_refs_key)
                 resp = s3.get_object(Bucket=refs_bucket, Key=s3_refs_key)
                 raw = resp.get('Body').read()
-                pipeline_valid_refs = json.loads(raw.decode('utf-8') if isinstance(raw, (bytes, bytearray)) else raw)
+                pipeline_valid_refs = loads_json(raw)
                 logger.info("Loaded definitive refs object of type %s", type(pipeline_valid_refs))
             except ClientError as ce:
                 logger.warning("Could not load definitive refs from S3 (%s/%s): %s", refs_bucket, s3_refs_key, ce)
@@ -218,8 +235,7 @@ def lambda_handler(event, context):
             local_refs = repo_root / 'data' / 'references' / Path(s3_refs_key).name
             if local_refs.exists():
                 try:
-                    with local_refs.open('r', encoding='utf-8') as fh:
-                        pipeline_valid_refs = json.load(fh)
+                    pipeline_valid_refs = loads_json(local_refs.read_bytes())
                     logger.info("Loaded definitive refs from local file: %s", local_refs)
                 except Exception:
                     logger.exception("Failed to load definitive refs from local file; continuing without definitive refs")
@@ -241,7 +257,7 @@ def lambda_handler(event, context):
                 logger.info("Loading Y-naming exclusions from s3://%s/%s", refs_bucket, exclusions_key)
                 resp = s3.get_object(Bucket=refs_bucket, Key=exclusions_key)
                 raw = resp.get('Body').read()
-                pipeline_ynaming_exclusions = json.loads(raw.decode('utf-8') if isinstance(raw, (bytes, bytearray)) else raw)
+                pipeline_ynaming_exclusions = loads_json(raw)
                 logger.info("Loaded Y-naming exclusions (type=%s, count=%s)", type(pipeline_ynaming_exclusions), 
                            len(pipeline_ynaming_exclusions) if isinstance(pipeline_ynaming_exclusions, (list, dict)) else 'N/A')
             except ClientError as ce:
@@ -255,8 +271,7 @@ def lambda_handler(event, context):
             local_exclusions = repo_root / 'data' / 'references' / Path(exclusions_key).name
             if local_exclusions.exists():
                 try:
-                    with local_exclusions.open('r', encoding='utf-8') as fh:
-                        pipeline_ynaming_exclusions = json.load(fh)
+                    pipeline_ynaming_exclusions = loads_json(local_exclusions.read_bytes())
                     logger.info("Loaded Y-naming exclusions from local file: %s", local_exclusions)
                 except Exception:
                     logger.exception("Failed to load Y-naming exclusions from local file; continuing without exclusions")
@@ -347,7 +362,7 @@ def lambda_handler(event, context):
     # merge XML files if requested (local mode only)
     if merge_xml and run_mode == "local":
         merged_output_path = work_dir / f"merged_{int(time.time())}.xml"
-        merge_xml_files(triggers_dir=work_dir, output_path=merged_output_path)
+        merge_xml_files(triggers_dir=work_dir, output_path=merged_output_path, keep_tree=False)
         xml_path_to_convert = merged_output_path
         logger.info("Merged XML written to: %s", merged_output_path)
     
@@ -370,7 +385,7 @@ def lambda_handler(event, context):
     try:
         with log_timing(f"XML->JSON ({xml_path_to_convert.name})", logger):
             records = convert_to_json(xml_path=str(xml_path_to_convert), output_dir=str(work_dir),
-                                      progress_verbose=VERBOSE_PROGRESS)
+                                      progress_verbose=VERBOSE_PROGRESS, workers=CONVERT_WORKERS)
         logger.info("Converted %d records", len(records))
         if transfer_register is not None:
             before = len(records)
@@ -399,8 +414,7 @@ def lambda_handler(event, context):
         for filename, _file in converted_xml_to_json_files.items():
             output_file = intermediate_dir / f"{filename}.json"
             try:
-                with output_file.open("w", encoding="utf-8") as fh:
-                    json.dump(_file, fh, ensure_ascii=False, indent=2)
+                output_file.write_bytes(dumps_json(_file))
             except Exception as exc:
                 print(f"Error writing transformed json to {output_file}: {exc}")
 
@@ -427,6 +441,7 @@ def lambda_handler(event, context):
         bfi_exclusion_list = []
         bfi_exclusion_code = os.getenv("BFI_EXCLUSION_CODE", None).strip()
         logger.info("Applying transformations to %d JSON files...", len(converted_xml_to_json_files))
+        npt = yt = None
         with progress_context(total = len(converted_xml_to_json_files), interval=100, label="Transforming") as tick:
             for i, (filename, _file) in enumerate(converted_xml_to_json_files.items(), start=1): #filename = iaid
 
@@ -442,8 +457,7 @@ def lambda_handler(event, context):
                             bfi_exclusion_dir.mkdir(parents=True, exist_ok=True)
                             bfi_exclusion_file = bfi_exclusion_dir / f"{filename}.json"
                             try:
-                                with bfi_exclusion_file.open("w", encoding="utf-8") as fh:
-                                    json.dump(_file, fh, ensure_ascii=False, indent=2)
+                                bfi_exclusion_file.write_bytes(dumps_json(_file))
                                 logger.debug("Saved BFI excluded JSON: %s", bfi_exclusion_file)
                             except Exception as exc:
                                 logger.warning("Failed to save BFI excluded JSON %s: %s", filename, exc)
@@ -476,8 +490,7 @@ def lambda_handler(event, context):
                         pre_transform_dir = intermediate_dir / "pre_transformed"
                         pre_transform_dir.mkdir(parents=True, exist_ok=True)
                         pre_transform_file = pre_transform_dir / f"{filename}.json"
-                        with pre_transform_file.open("w", encoding="utf-8") as fh:
-                            json.dump(_file, fh, ensure_ascii=False, indent=2)
+                        pre_transform_file.write_bytes(dumps_json(_file))
                         logger.debug("Saved pre-transformed JSON: %s", pre_transform_file)
 
                     # debugging - filter by json pre and post transformation and print to console
@@ -487,33 +500,38 @@ def lambda_handler(event, context):
 
                     # newline to <p> transformation
                     transformed_json = None
-                    task = transformation_config['tasks'].get('newline_to_p', {})
-                    npt = NewlineToPTransformer(target_columns=task.get('target_columns'),
-                                              **task.get('params', {}))
+                    # transformers are built on the first record and reused, so their
+                    # per-instance caches carry over between records
+                    if npt is None:
+                        task = transformation_config['tasks'].get('newline_to_p', {})
+                        npt = NewlineToPTransformer(target_columns=task.get('target_columns'),
+                                                  **task.get('params', {}))
                     transformed_json = npt.transform(_file)
 
                     # Y naming transformation
-                    task = transformation_config['tasks'].get('y_naming')
-                    yt = YNamingTransformer(target_columns=task.get('target_columns'))
-                    # set definitive refs on the transformer instance if we loaded them above
-                    try:
-                        if pipeline_valid_refs:
-                            yt.set_definitive_refs(pipeline_valid_refs)
-                            logger.debug("Set definitive refs on YNamingTransformer (count=%s)", None if yt._refs is None else len(yt._refs))
-                    except Exception:
-                        logger.exception("Failed to set definitive refs on YNamingTransformer instance")
-                    # set Y-naming exclusions if loaded
-                    try:
-                        if pipeline_ynaming_exclusions:
-                            # Handle both list and dict shapes (dict may have 'exclusions' key)
-                            exclusions_list = pipeline_ynaming_exclusions
-                            if isinstance(pipeline_ynaming_exclusions, dict):
-                                exclusions_list = pipeline_ynaming_exclusions.get('exclusions', pipeline_ynaming_exclusions.get('patterns', []))
-                            yt.set_ynaming_exclusions(exclusions_list)
-                            logger.debug("Set Y-naming exclusions on transformer (count=%s)", len(yt._exclusion_patterns))
-                    except Exception:
-                        logger.exception("Failed to set Y-naming exclusions on YNamingTransformer instance")
-                    transformed_json = yt.transform(transformed_json)
+                    if yt is None:
+                        task = transformation_config['tasks'].get('y_naming')
+                        yt = YNamingTransformer(target_columns=task.get('target_columns'))
+                        # set definitive refs on the transformer instance if we loaded them above
+                        try:
+                            if pipeline_valid_refs:
+                                yt.set_definitive_refs(pipeline_valid_refs)
+                                logger.debug("Set definitive refs on YNamingTransformer (count=%s)", None if yt._refs is None else len(yt._refs))
+                        except Exception:
+                            logger.exception("Failed to set definitive refs on YNamingTransformer instance")
+                        # set Y-naming exclusions if loaded
+                        try:
+                            if pipeline_ynaming_exclusions:
+                                # Handle both list and dict shapes (dict may have 'exclusions' key)
+                                exclusions_list = pipeline_ynaming_exclusions
+                                if isinstance(pipeline_ynaming_exclusions, dict):
+                                    exclusions_list = pipeline_ynaming_exclusions.get('exclusions', pipeline_ynaming_exclusions.get('patterns', []))
+                                yt.set_ynaming_exclusions(exclusions_list)
+                                logger.debug("Set Y-naming exclusions on transformer (count=%s)", len(yt._exclusion_patterns))
+                        except Exception:
+                            logger.exception("Failed to set Y-naming exclusions on YNamingTransformer instance")
+                    # transformed_json is a fresh copy from npt, so Y naming can work on it directly
+                    transformed_json = yt.transform(transformed_json, inplace=True)
 
                     # filter on record and print to console to see before and after effect of transformations
                     # set to none in .env (or current config file) to turn off
@@ -572,8 +590,7 @@ def lambda_handler(event, context):
                         post_transform_dir = intermediate_dir / "post_transformed"
                         post_transform_dir.mkdir(parents=True, exist_ok=True)
                         post_transform_file = post_transform_dir / f"{filename}.json"
-                        with post_transform_file.open("w", encoding="utf-8") as fh:
-                            json.dump(transformed_json, fh, ensure_ascii=False, indent=2)
+                        post_transform_file.write_bytes(dumps_json(transformed_json))
                         logger.debug("Saved post-transformed JSON: %s", post_transform_file)
 
                     # Save the final transformed JSON
@@ -680,7 +697,7 @@ def lambda_handler(event, context):
                             with tarfile.open(fileobj=buf, mode="w:gz") as tar:
                                 for filename, json_data in chunk:
                                     safe_name = f"{Path(filename).name}.json"
-                                    json_bytes = json.dumps(json_data, ensure_ascii=False, indent=2).encode("utf-8")
+                                    json_bytes = dumps_json(json_data)
                                     ti = tarfile.TarInfo(name=safe_name)
                                     ti.size = len(json_bytes)
                                     ti.mtime = int(time.time())
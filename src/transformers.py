@@ -1,547 +1,468 @@
 import re
 import copy
+from collections import deque
 from typing import Any, Optional, Iterable, List, Set
 import xml.etree.ElementTree as ET
 import json
 from datetime import datetime, timedelta
-import re
 import os
 import logging
 import sys
-
-
-def convert_to_json(xml_path: str, output_dir: str, remove_empty_fields: bool = True, 
-                    progress_verbose: bool = False):
-    # this function relies on module-level `tree` and `root` set by the caller
-    # (the main runner sets these globals before calling convert_to_json)
-    global tree, root
-
-    record_level_mapping = {
-        'FONDS': 1,
-        'SUB-FONDS': 2,
-        'SUB-SUB-FONDS': 3,
-        'SUB-SUB-SUB-FONDS': 4,
-        'SUB-SUB-SUB-SUB-FONDS': 5,
-        'SERIES': 6,
-        'SUB-SERIES': 7,
-        'SUB-SUB-SERIES': 8,
-        'FILE': 9,
-        'ITEM': 10
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # optional accelerator; the stdlib json module is used instead
+    orjson = None
+
+from src.utils import loads_json
+
+
+# Plain text fields read straight off each <record> element, in the order the
+# record loop consumes them: (local name, element path, value when the element
+# is missing, converter applied to the element text or '' for none).
+_RECORD_TEXT_FIELDS = (
+    ("citableReference", "object_number", None, ""),
+    ("part_of_reference", "Part_of/part_of_reference", None, ""),
+    ("accruals", "accruals", None, ""),
+    ("administrativeBackground", "admin_history", None, ""),
+    ("arrangement_system", "system_of_arrangement", "", ""),
+    ("client_filepath", "client_filepath", "", ""),
+    ("catalogueId", "catid", None, "int"),
+    ("catalogueLevel", "record_type/value[@lang='neutral']", None, ""),
+    ("coveringFromDate", "Dating/dating.date.start", None, ""),
+    ("coveringToDate", "Dating/dating.date.end", None, ""),
+    ("coveringDates", "dating.notes", None, ""),
+    ("custodialHistory", "object_history_note", None, ""),
+    ("heldBy_information", "institution.name", None, ""),
+    ("copiesInformation_description", "existence_of_copies", None, ""),
+    ("digitised", "digitised", None, ""),
+    ("language", "Inscription//inscription.language", None, ""),
+    ("legalStatus", "legal_status/value[@lang='0']", None, ""),
+    ("locationOfOriginals_xReferenceDescription", "existence_of_originals", None, ""),
+    ("publicationNote_string", "publication_note", None, ""),
+    ("relatedMaterial_description", "related_material.free_text", None, ""),
+    ("scopeContent_description", "Content_description/content.description", None, ""),
+    ("title", "Title/title", None, ""),
+    ("unpublishedFindingAids_string", "Finding_aids/finding_aids", None, ""),
+)
+
+
+def _build_record_text_extractor(fields):
+    """Generate a straight-line extractor for `fields` so the per-record loop
+    does not re-dispatch on the schema for every field of every record."""
+    lines = ["def _extract_record_text(record):"]
+    for name, path, missing, convert in fields:
+        lines.append(f"    {name} = record.find({path!r})")
+        lines.append(f"    {name} = {convert}({name}.text) if {name} is not None else {missing!r}")
+    lines.append(f"    return ({', '.join(name for name, _, _, _ in fields)},)")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["_extract_record_text"]
+
+
+_extract_record_text = _build_record_text_extractor(_RECORD_TEXT_FIELDS)
+
+# heldBy reference for each known institution.name value. The strings recur in
+# every record, so they are interned once here and shared by all outputs.
+_HELD_BY = {
+    sys.intern(name): {
+        "xReferenceId": sys.intern(reference_id),
+        "xReferenceCode": sys.intern(reference_code),
+        "xReferenceName": sys.intern(name),
     }
+    for name, reference_id, reference_code in (
+        ("The National Archives, Kew", "A13530124", "66"),
+        ("UK Parliament", "A13531051", "61"),
+        ("British Film Institute (BFI) National Archive", "A13532152", "2870"),
+    )
+}
+
+_RECORD_LEVEL_MAPPING = {
+    'FONDS': 1,
+    'SUB-FONDS': 2,
+    'SUB-SUB-FONDS': 3,
+    'SUB-SUB-SUB-FONDS': 4,
+    'SUB-SUB-SUB-SUB-FONDS': 5,
+    'SERIES': 6,
+    'SUB-SERIES': 7,
+    'SUB-SUB-SERIES': 8,
+    'FILE': 9,
+    'ITEM': 10
+}
+
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+
+def _compact_iso_dates(text: str) -> str:
+    """Rewrite YYYY-MM-DD dates in `text` as YYYYMMDD.
+
+    Dating elements normally hold exactly one date, which is sliced directly;
+    anything else goes through the regex so embedded dates are still handled.
+    """
+    if (len(text) == 10 and text[4] == '-' and text[7] == '-'
+            and text[:4].isdecimal() and text[5:7].isdecimal() and text[8:].isdecimal()):
+        return text[:4] + text[5:7] + text[8:]
+    return _ISO_DATE_RE.sub(r"\1\2\3", text)
+
+
+def _index_alternative_numbers(record) -> dict:
+    """Map each alternative_number.type of `record` to the first
+    <Alternative_number> element carrying it, matching what
+    record.find("Alternative_number/[alternative_number.type='...']") returns."""
+    index = {}
+    for alternative in record.findall('Alternative_number'):
+        for number_type in alternative.findall('alternative_number.type'):
+            index.setdefault("".join(number_type.itertext()), alternative)
+    return index
+
+
+def _format_languages(text: str) -> str:
+    """Turn 'English; Welsh; French' into 'English, Welsh and French', sorting
+    all but the last language. A single language is returned untouched."""
+    if ';' not in text:
+        return text
+    parts = [part.strip() for part in text.split(';')]
+    if len(parts) == 2:
+        return parts[0] + ' and ' + parts[1]
+    last = parts.pop()
+    parts.sort()
+    return ', '.join(parts) + ' and ' + last
+
+
+def _clean_none_inplace(obj):
+    """Remove None values and empty containers from a JSON-shaped tree, in place.
+    - dict: remove keys with None/empty values
+    - list: keep only items that are not None/empty
+    Containers are visited children-first with an explicit stack, so a
+    container emptied by the pruning is itself removed from its parent.
+    Returns `obj`, or None if it is None or ends up empty.
+    """
+    if obj is None:
+        return None
+    if not isinstance(obj, (dict, list)):
+        return obj
 
-    parsed_tree = ET.parse(xml_path)
-    globals()["tree"] = parsed_tree
-    globals()["root"] = parsed_tree.getroot()
-
-    for record_type in root.iter('record_type'):
-        neutral_value = record_type.find("./value[@lang='neutral']")
-        if neutral_value is not None:
-            key = neutral_value.text.strip()
-            if key in record_level_mapping:
-                record_type.find("./value[@lang='neutral']").text = str(record_level_mapping[key])
-
-
-    for client_filepath in root.iter('client_filepath'):
-            if client_filepath is not None:
-                client_filepath.text = "Original filepath:" + client_filepath.text.strip()
-
-
-    for start_date in root.iter('dating.date.start'):
-        date_unconverted = start_date.text
-
-        if date_unconverted:
-            try:
-                unconverted_date_pattern = r"(\d{4})-(\d{2})-(\d{2})"
-                converted_date_pattern = r"\1\2\3"
-                date_unconverted = re.sub(unconverted_date_pattern, converted_date_pattern, date_unconverted)
-                start_date.text = date_unconverted
-
-            except ValueError as e:
-                print(f"Error converting date '{date_unconverted}' : {e}")
-
-
-    for end_date in root.iter('dating.date.end'):
-        date_unconverted = end_date.text
-
-
-        if date_unconverted:
-            try:
-                unconverted_date_pattern = r"(\d{4})-(\d{2})-(\d{2})"
-                converted_date_pattern = r"\1\2\3"
-                date_unconverted = re.sub(unconverted_date_pattern, converted_date_pattern, date_unconverted)
-                end_date.text = date_unconverted
-
-            except ValueError as e:
-                print(f"Error converting date '{date_unconverted}' : {e}")
-
-
-    for language in root.iter('inscription.language'):
-        if language.text is not None:
-            languages = [language_item.strip() for language_item in language.text.split(';')]
-            if len(languages) > 1:
-                sorted_languages = ', '.join(sorted(languages[:-1])) + ' and ' + languages[-1]
-                language.text = sorted_languages
-
-    # Create dictionary for parentId resolution
-    object_number_dict = {}
-    for record in root.iter('record'):
-        object_number_elem = record.find("object_number")
-        if object_number_elem is not None and object_number_elem.text:
-            object_number = object_number_elem.text
-
-            # Find the CALM RecordID for this record
-            calm_id_elem = record.find("Alternative_number/[alternative_number.type='CALM RecordID']")
-            if calm_id_elem is not None:
-                alt_number_elem = calm_id_elem.find('alternative_number')
-                if alt_number_elem is not None and alt_number_elem.text:
-                    object_number_dict[object_number] = alt_number_elem.text
-
-    # diagnostic counters: how many record nodes processed and unique files written
-    _records_processed = 0
-    _written_paths = set()
-
-    records = {}
-    _total_records = len(list(root.iter('record')))
-    for i, record in enumerate (root.iter('record')):
-
-    ######################## Find_CALM_Record_ID_Element ###########################################################
-
-        Find_CALM_Record_ID_Element = record.find("Alternative_number/[alternative_number.type='CALM RecordID']")
-        if Find_CALM_Record_ID_Element is not None:
-            iaid = Find_CALM_Record_ID_Element.find('alternative_number').text
-        else:
-            iaid = None
-
-        citableReference = record.find("object_number")
-        citableReference = citableReference.text if citableReference is not None else None
-
-        #accumulationDates #-- not used
-
-    #################################### parentId ####################################################################
-
-        part_of_reference = record.find("Part_of/part_of_reference")
-        part_of_reference = part_of_reference.text if part_of_reference is not None else None
-
-        parentId = "A13530124"  # Fond level value
-
-        # Use the lookup dictionary for parentId resolution
-        if part_of_reference and part_of_reference in object_number_dict:
-            parentId = object_number_dict[part_of_reference]
-
-        accruals = record.find("accruals")
-        accruals = accruals.text if accruals is not None else None
+    # pre-order listing of every container; walking it backwards visits
+    # each child before its parent
+    containers = [obj]
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        for value in (current.values() if isinstance(current, dict) else current):
+            if isinstance(value, (dict, list)):
+                containers.append(value)
+                stack.append(value)
+
+    for current in reversed(containers):
+        if isinstance(current, dict):
+            dead = [k for k, v in current.items()
+                    if v is None or (isinstance(v, (dict, list)) and not v)]
+            for k in dead:
+                del current[k]
+        elif any(v is None or (isinstance(v, (dict, list)) and not v) for v in current):
+            current[:] = [v for v in current
+                          if not (v is None or (isinstance(v, (dict, list)) and not v))]
+
+    return obj if obj else None
+
+
+def _record_to_json(record, record_alternatives: dict, remove_empty_fields: bool):
+    """Build the Discovery JSON for a single <record> element.
+
+    Returns an ``(iaid, part_of_reference, record_json)`` triple, where
+    `record_alternatives` is the record's index from _index_alternative_numbers.
+    parentId is left at the fonds-level default; the caller resolves it from
+    `part_of_reference` once every record's object number is known.
+    """
 
-        #accessConditions = record.find("access_category.notes") #should apply only to level 1-8    # not used in this form anymore anymore
-        #accessConditions =  accessConditions.text if accessConditions is not None else None
+######################## Find_CALM_Record_ID_Element ###########################################################
 
-        administrativeBackground = record.find("admin_history")
-        administrativeBackground = administrativeBackground.text if administrativeBackground is not None else None
+    Find_CALM_Record_ID_Element = record_alternatives.get('CALM RecordID')
+    if Find_CALM_Record_ID_Element is not None:
+        iaid = Find_CALM_Record_ID_Element.find('alternative_number').text
+    else:
+        iaid = None
 
-        #appraisalInformation = record.find("disposal.notes")                                        # not used used anymore
-        #appraisalInformation = appraisalInformation.text if appraisalInformation is not None else None
+    (citableReference, part_of_reference, accruals, administrativeBackground,
+     arrangement_system, client_filepath, catalogueId, catalogueLevel,
+     coveringFromDate, coveringToDate, coveringDates, custodialHistory,
+     heldBy_information, copiesInformation_description, digitised,
+     language, legalStatus,
+     locationOfOriginals_xReferenceDescription, publicationNote_string,
+     relatedMaterial_description, scopeContent_description, title,
+     unpublishedFindingAids_string) = _extract_record_text(record)
 
-    ############################# arrangement###########################################################################
+    #accumulationDates #-- not used
 
-        arrangement_system = record.find("system_of_arrangement") #values of system_of_arrangement and client_filepath need to be aggregted in arrangement JSON field
-        arrangement_system = arrangement_system.text if arrangement_system is not None else ''
-        client_filepath = record.find("client_filepath")
-        client_filepath = client_filepath.text if client_filepath is not None else ''
+#################################### parentId ####################################################################
 
-        arrangement = arrangement_system+' '+client_filepath
-        arrangement = arrangement.strip()
+    parentId = "A13530124"  # Fond level value
 
-        if arrangement == "":
-            arrangement = None
+    #accessConditions = record.find("access_category.notes") #should apply only to level 1-8    # not used in this form anymore anymore
+    #accessConditions =  accessConditions.text if accessConditions is not None else None
 
-        catalogueId = record.find("catid")
-        catalogueId = int(catalogueId.text) if catalogueId is not None else None
+    #appraisalInformation = record.find("disposal.notes")                                        # not used used anymore
+    #appraisalInformation = appraisalInformation.text if appraisalInformation is not None else None
 
-    ############ catalogueLevel and access condition #############################################################################
+############################# arrangement###########################################################################
 
-        catalogueLevel = record.find("record_type/value[@lang='neutral']")
-        catalogueLevel = catalogueLevel.text if catalogueLevel is not None else None
-        if catalogueLevel is not None:
-            catalogueLevel = int(catalogueLevel)
+    arrangement = arrangement_system+' '+client_filepath
+    arrangement = arrangement.strip()
 
-        if catalogueLevel >= 9:
-            accessConditions =  None
+    if arrangement == "":
+        arrangement = None
 
-        if catalogueLevel <= 8:
-            accessConditions =  "Open unless otherwise stated"
+############ catalogueLevel and access condition #############################################################################
 
-        coveringFromDate = record.find("Dating/dating.date.start")
-        coveringFromDate = coveringFromDate.text if coveringFromDate is not None else None
-        if coveringFromDate is not None:
-            coveringFromDate = int(coveringFromDate)
+    if catalogueLevel is not None:
+        catalogueLevel = int(catalogueLevel)
 
-        coveringToDate = record.find("Dating/dating.date.end")
-        coveringToDate = coveringToDate.text if coveringToDate is not None else None
-        if coveringToDate is not None:
-            coveringToDate = int(coveringToDate)
+    if catalogueLevel >= 9:
+        accessConditions =  None
 
-        chargeType = 1
+    if catalogueLevel <= 8:
+        accessConditions =  "Open unless otherwise stated"
 
-        coveringDates = record.find("dating.notes")
-        coveringDates = coveringDates.text if coveringDates is not None else None
+    if coveringFromDate is not None:
+        coveringFromDate = int(coveringFromDate)
 
-        custodialHistory = record.find("object_history_note")
-        custodialHistory = custodialHistory.text if custodialHistory is not None else None
+    if coveringToDate is not None:
+        coveringToDate = int(coveringToDate)
 
-    ################### heldBy #######################################################
+    chargeType = 1
 
-        heldBy_information = record.find("institution.name")
-        heldBy_information = heldBy_information.text if heldBy_information is not None else None
+################### heldBy #######################################################
 
-        heldBy = []
+    heldBy = []
 
-        if heldBy_information == "The National Archives, Kew":
-            heldBy = [
-        {
-        "xReferenceId": "A13530124",
-        "xReferenceCode": "66",
-        "xReferenceName": "The National Archives, Kew"
-        }
-    ]
-        elif heldBy_information == "UK Parliament":
-            heldBy = [
-        {
-        "xReferenceId": "A13531051",
-        "xReferenceCode": "61",
-        "xReferenceName": "UK Parliament"
-        }
-    ]
+    held_by_reference = _HELD_BY.get(heldBy_information)
+    if held_by_reference is not None:
+        heldBy = [dict(held_by_reference)]
 
-        elif heldBy_information == "British Film Institute (BFI) National Archive":
-            heldBy = [
-        {
-        "xReferenceId": "A13532152",
-        "xReferenceCode": "2870",
-        "xReferenceName": "British Film Institute (BFI) National Archive"
-        }
-    ]
+######### ClosureCode ClosureStatus and closure Type ##################################
 
-    ######### ClosureCode ClosureStatus and closure Type ##################################
+    if catalogueLevel >= 9:
+        closureStatus = record.find("access_status/value[@lang='neutral']")
+        closureStatus = closureStatus.text if closureStatus is not None else None
 
-        if catalogueLevel >= 9:
-            closureStatus = record.find("access_status/value[@lang='neutral']")
-            closureStatus = closureStatus.text if closureStatus is not None else None
+        if closureStatus == 'OPEN':
+            closureStatus = 'O'
+        elif closureStatus == 'CLOSED':
+            closureStatus = 'D'
 
-            if closureStatus == 'OPEN':
-                closureStatus = 'O'
-            elif closureStatus == 'CLOSED':
-                closureStatus = 'D'
+        closureCode = record.find("closed_until")
+        if closureStatus == 'D': #and closureCode is not None:
+            closureCode = closureCode.text
+            closureCode = datetime.strptime(closureCode, "%Y-%m-%d")
+            closureCode = closureCode.strftime("%Y")
+        else:
+            closureCode = None
 
-            closureCode = record.find("closed_until")
-            if closureStatus == 'D': #and closureCode is not None:
-                closureCode = closureCode.text
-                closureCode = datetime.strptime(closureCode, "%Y-%m-%d")
-                closureCode = closureCode.strftime("%Y")
-            else:
-                closureCode = None
+        closureType = None
 
+        if closureStatus == 'D':
+            closureType = 'U'
+        else:
             closureType = None
 
-            if closureStatus == 'D':
-                closureType = 'U'
-            else:
-                closureType = None
-
-            if heldBy_information == "UK Parliament":
-                closureStatus = 'U'
-                closureCode = None
-                closureType = None
-
-        if catalogueLevel <= 8:
-            closureStatus = None
+        if heldBy_information == "UK Parliament":
+            closureStatus = 'U'
             closureCode = None
             closureType = None
 
+    if catalogueLevel <= 8:
+        closureStatus = None
+        closureCode = None
+        closureType = None
 
-    ################### recordOpeningDate #######################################################
 
-        if catalogueLevel >= 9:
+################### recordOpeningDate #######################################################
 
-            recordOpeningDate = record.find("closed_until")
-            recordOpeningDate = recordOpeningDate.text if recordOpeningDate is not None else None
+    if catalogueLevel >= 9:
 
-            if record.find("access_status/value[@lang='neutral']").text == 'CLOSED' and heldBy_information == "UK Parliament":
-                recordOpeningDate = None
+        recordOpeningDate = record.find("closed_until")
+        recordOpeningDate = recordOpeningDate.text if recordOpeningDate is not None else None
 
-        if catalogueLevel <= 8:
+        if record.find("access_status/value[@lang='neutral']").text == 'CLOSED' and heldBy_information == "UK Parliament":
             recordOpeningDate = None
 
+    if catalogueLevel <= 8:
+        recordOpeningDate = None
 
 
 
-    ################### copiesInformation #######################################################
 
-        copiesInformation_description = record.find("existence_of_copies")
-        copiesInformation_description = copiesInformation_description.text if copiesInformation_description is not None else None
+################### copiesInformation #######################################################
 
-        copiesInformation = []
-        if copiesInformation_description is not None:
-            copiesInformation = [
+    copiesInformation = [
         {
         "xReferenceName": None,
         "xReferenceDescription": None,
         "description": copiesInformation_description
         }
     ]
-        else:
-            copiesInformation = [
+################### creatorName #######################################################
+    # At levels 9-10 do not supply any values (even if present in the Axiell export) into the creatorName field
+    #if catalogueLevel >= 9:
+
+    #    creatorName = [
+    #    {
+    #    "xReferenceName": None,
+    #    "preTitle": None,
+    #    "title": None,
+    #    "firstName": None,
+    #    "surname": None,
+    #    "startDate": 0,
+    #    "endDate": 0
+    #    }
+    #]
+
+    if catalogueLevel <= 8:
+        production_elements = record.findall("Production")
+        creatorName = []
+        #Looping through each production element to find creator sub-elements
+        if production_elements:
+            for production in production_elements:
+                creator_element = production.find("creator")
+                if creator_element is not None and creator_element.text:
+                    creatorName.append({
+                        "xReferenceName": creator_element.text,
+                        "preTitle": None,
+                        "title": None,
+                        "firstName": None,
+                        "surname": None,
+                        "startDate": 0,
+                        "endDate": 0
+                    })
+    else:
+        creatorName = None
+
+
+############################ digitised ##########################################################
+
+    if digitised == "x":
+        digitised = True
+    else:
+        digitised = False
+
+########################### formerReferenceDep ###################################################
+
+    Find_Former_Ref_Department_Element = record_alternatives.get('Former reference (Department)')
+    if Find_Former_Ref_Department_Element is not None:
+        formerReferenceDep = Find_Former_Ref_Department_Element.find('alternative_number').text
+    else:
+        formerReferenceDep = None
+
+    Find_Former_Archival_Ref_Element = record_alternatives.get('Former archival reference')
+    if Find_Former_Archival_Ref_Element is not None:
+        formerReferencePro = Find_Former_Archival_Ref_Element.find('alternative_number').text
+    else:
+        formerReferencePro = None
+
+    # immediateSourceOfAcquisition (acquisition.notes) is not emitted; see the commented key below
+
+################################# existence_of_originals #######################################
+
+    locationOfOriginals = [
         {
         "xReferenceName": None,
-        "xReferenceDescription": None,
-        "description": None
+        "xReferenceDescription": locationOfOriginals_xReferenceDescription
         }
     ]
-    ################### creatorName #######################################################
-        # At levels 9-10 do not supply any values (even if present in the Axiell export) into the creatorName field
-        #if catalogueLevel >= 9:
-
-        #    creatorName = [
-        #    {
-        #    "xReferenceName": None,
-        #    "preTitle": None,
-        #    "title": None,
-        #    "firstName": None,
-        #    "surname": None,
-        #    "startDate": 0,
-        #    "endDate": 0
-        #    }
-        #]
-
-        if catalogueLevel <= 8:
-            production_elements = record.findall("Production")
-            creatorName = []
-            #Looping through each production element to find creator sub-elements
-            if production_elements:
-                for production in production_elements:
-                    creator_element = production.find("creator")
-                    if creator_element is not None and creator_element.text:
-                        creatorName.append({
-                            "xReferenceName": creator_element.text,
-                            "preTitle": None,
-                            "title": None,
-                            "firstName": None,
-                            "surname": None,
-                            "startDate": 0,
-                            "endDate": 0
-                        })
-        else:
-            creatorName = None
 
 
-    ############################ digitised ##########################################################
+######################################## physicalDescriptionExtent and physicalDescriptionForm ########################################################################################################
 
-        digitised = record.find("digitised")
-        digitised = digitised.text if digitised is not None else None
 
-        if digitised == "x":
-            digitised = True
-        else:
-            digitised = False
+    extent_descriptions = []
 
-    ########################### formerReferenceDep ###################################################
+    for extent in record.findall('Extent'):
+        value_elem = extent.find("extent.value")
+        form_elem = extent.find("extent.form")
 
-        Find_Former_Ref_Department_Element = record.find("Alternative_number/[alternative_number.type='Former reference (Department)']")
-        if Find_Former_Ref_Department_Element is not None:
-            formerReferenceDep = Find_Former_Ref_Department_Element.find('alternative_number').text
-        else:
-            formerReferenceDep = None
+        value_text = value_elem.text.strip() if value_elem is not None and value_elem.text else ""
+        form_text = form_elem.text.strip() if form_elem is not None and form_elem.text else ""
 
-        Find_Former_Archival_Ref_Element = record.find("Alternative_number/[alternative_number.type='Former archival reference']")
-        if Find_Former_Archival_Ref_Element is not None:
-            formerReferencePro = Find_Former_Archival_Ref_Element.find('alternative_number').text
-        else:
-            formerReferencePro = None
+        if value_text or form_text:
+            extent_descriptions.append((value_text, form_text))
 
-        ########################### immediateSourceOfAcquisition ###################################################
+    physicalDescriptionExtent = extent_descriptions[0][0] if extent_descriptions else None
 
-        immediateSourceOfAcquisition_xReferenceDescription = record.find("acquisition.notes")
-        immediateSourceOfAcquisition_xReferenceDescription =  immediateSourceOfAcquisition_xReferenceDescription.text if immediateSourceOfAcquisition_xReferenceDescription is not None else None
+    physicalDescriptionForm = []
+    if extent_descriptions:
+        first_form = extent_descriptions[0][1]
+        if first_form:
+            physicalDescriptionForm.append(f" {first_form}")
+        for value, form in extent_descriptions[1:]:
+            physicalDescriptionForm.append(f"{value} {form}".strip())
 
-        immediateSourceOfAcquisition = []
+    physicalDescriptionForm = '; '.join(physicalDescriptionForm) if physicalDescriptionForm else None
 
-        if immediateSourceOfAcquisition_xReferenceDescription is not None:
-            immediateSourceOfAcquisition = [
-        {
-        "xReferenceName": None,
-        "xReferenceDescription": immediateSourceOfAcquisition_xReferenceDescription,
-        "preTitle": None,
-        "title": None,
-        "firstName": None,
-        "surname": None,
-        "startDate": 0,
-        "endDate": 0
-        }
-    ]
-        else:
-            immediateSourceOfAcquisition = [
-        {
-        "xReferenceName": None,
-        "xReferenceDescription": None,
-        "preTitle": None,
-        "title": None,
-        "firstName": None,
-        "surname": None,
-        "startDate": 0,
-        "endDate": 0
-        }
-    ]
 
-        language = record.find("Inscription//inscription.language")
-        language = language.text if language is not None else None
+################################ referencePart ###########################################################
 
-        legalStatus = record.find("legal_status/value[@lang='0']")
-        legalStatus = legalStatus.text if legalStatus is not None else None
-        
-    ################################# existence_of_originals #######################################
+    referencePart = citableReference
 
-        locationOfOriginals_xReferenceDescription = record.find("existence_of_originals")
-        locationOfOriginals_xReferenceDescription = locationOfOriginals_xReferenceDescription.text if locationOfOriginals_xReferenceDescription is not None else None
+    referencePart_pattern = r"([^\/]+$)"
+    referencePart_pattern_match = re.search(referencePart_pattern, referencePart)
+    referencePart = referencePart_pattern_match.group()
 
-        locationOfOriginals = []
+################################ publicationNote ###########################################################
 
-        if locationOfOriginals_xReferenceDescription is not None:
-            locationOfOriginals = [
-            {
-            "xReferenceName": None,
-            "xReferenceDescription": locationOfOriginals_xReferenceDescription
-            }
-    ]
-        else:
-            locationOfOriginals = [
-        {
-        "xReferenceName": None,
-        "xReferenceDescription": None
-        }
-    ]
-
-
-    ######################################## physicalDescriptionExtent and physicalDescriptionForm ########################################################################################################
-
-
-        extent_descriptions = []
-
-        for extent in record.findall('Extent'):
-            value_elem = extent.find("extent.value")
-            form_elem = extent.find("extent.form")
-
-            value_text = value_elem.text.strip() if value_elem is not None and value_elem.text else ""
-            form_text = form_elem.text.strip() if form_elem is not None and form_elem.text else ""
-
-            if value_text or form_text:
-                extent_descriptions.append((value_text, form_text))
-
-        physicalDescriptionExtent = extent_descriptions[0][0] if extent_descriptions else None
-
-        physicalDescriptionForm = []
-        if extent_descriptions:
-            first_form = extent_descriptions[0][1]
-            if first_form:
-                physicalDescriptionForm.append(f" {first_form}")
-            for value, form in extent_descriptions[1:]:
-                physicalDescriptionForm.append(f"{value} {form}".strip())
-
-        physicalDescriptionForm = '; '.join(physicalDescriptionForm) if physicalDescriptionForm else None
-
-
-    ################################ referencePart ###########################################################
-
-        referencePart = record.find("object_number")
-        referencePart = referencePart.text if referencePart is not None else None
-
-        referencePart_pattern = r"([^\/]+$)"
-        referencePart_pattern_match = re.search(referencePart_pattern, referencePart)
-        referencePart = referencePart_pattern_match.group()
-
-    ################################ publicationNote ###########################################################
+    publicationNote = [publicationNote_string]
 
-        publicationNote_string = record.find("publication_note")
-        publicationNote_string = publicationNote_string.text if publicationNote_string is not None else None
+################################ publicationNote ###########################################################
 
-        if publicationNote_string is not None:
-            publicationNote = []
-            publicationNote = [
-            publicationNote_string
-        ]
 
-        elif publicationNote_string is None:
-            publicationNote = []
-            publicationNote = [
-            None
-        ]
-
-    ################################ publicationNote ###########################################################
-
-
-        relatedMaterial_description = record.find("related_material.free_text")
-        relatedMaterial_description = relatedMaterial_description.text if relatedMaterial_description is not None else None
-
-        if relatedMaterial_description is not None:
-            relatedMaterial = []
-            relatedMaterial = [
-        {
-        "xReferenceId": None,
-        "description":  relatedMaterial_description
-        }
-    ]
-        elif relatedMaterial_description is None:
-            relatedMaterial = []
-            relatedMaterial = [
+    relatedMaterial = [
         {
         "xReferenceId": None,
-        "description":  None
+        "description": relatedMaterial_description
         }
     ]
 
-    ################################# separatedMaterial ##############################################################
+################################# separatedMaterial ##############################################################
 
-        separatedMaterial = []
-        separatedMaterial = [
+    separatedMaterial = [
         {
         "xReferenceId": None,
         "description": None
         }
     ]
 
-    ###################################################################################################################
+###################################################################################################################
 
 
-        #registryRecords -- not used and not in JSON template
-    
-    ################################ restrictionsOnUse ##############################################################
+    #registryRecords -- not used and not in JSON template
 
-        if digitised == False and heldBy_information == "British Film Institute (BFI) National Archive":
-            restrictionsOnUse = "This record is not currently accessible in a playable format and is unavailable for public viewing"
-        else:
-            restrictionsOnUse = None
+################################ restrictionsOnUse ##############################################################
 
-    ##################################### scopeContent ##################################################################
+    if digitised == False and heldBy_information == "British Film Institute (BFI) National Archive":
+        restrictionsOnUse = "This record is not currently accessible in a playable format and is unavailable for public viewing"
+    else:
+        restrictionsOnUse = None
 
-        scopeContent_description = record.find("Content_description/content.description")
-        scopeContent_description = scopeContent_description.text if scopeContent_description is not None else None
+##################################### scopeContent ##################################################################
 
-        if scopeContent_description is not None:
-            scopeContent = []
-            scopeContent = {
-            "personNames": [
+    scopeContent = {
+        "personNames": [
             {
             "firstName": None,
             "surname": None
-        }
+            }
         ],
         "placeNames": [
-        {
+            {
             "xReferenceName": None
-        }
+            }
         ],
         "refferedToDate": None,
         "organizations": [
-        {
+            {
             "xReferenceName": None
-        }
+            }
         ],
         "description": scopeContent_description,
         "ephemera": None,
@@ -549,173 +470,398 @@ def convert_to_json(xml_path: str, output_dir: str, remove_empty_fields: bool =
         "schema": None
     }
 
-        elif scopeContent_description is None:
-            scopeContent = []
-            scopeContent = {
-            "personNames": [
-            {
-            "firstName": None,
-            "surname": None
-        }
-        ],
-        "placeNames": [
-        {
-            "xReferenceName": None
-        }
-        ],
-        "refferedToDate": None,
-        "organizations": [
-        {
-            "xReferenceName": None
-        }
-        ],
-        "description": None,
-        "ephemera": None,
-        "occupations": None,
-        "schema": None
-    }
+    # subjects is not emitted; see the commented key below
+
+################################### unpublishedFindingAids ###########################################################
+
+    unpublishedFindingAids = [unpublishedFindingAids_string]
+
+########################################## storing XML values in JSON dictionary ###########################################
+
+    record_data = { "record": {
+                    #"$schema": "./PA_JSON_Schema.json",  # for schema validation in Visual Studio
+                    "iaid": iaid,
+                    #"replicaId": None,
+                    "citableReference": citableReference,
+                    "parentId": parentId,
+                    #"accumulationDates": None,
+                    "accruals": accruals,
+                    "accessConditions": accessConditions,
+                    "administrativeBackground": administrativeBackground,
+                    #"appraisalInformation": appraisalInformation,
+                    "arrangement": arrangement, #arrangement_system+' '+client_filepath,
+                    #"batchId": None,
+                    #"refIaid": None,
+                    "catalogueId": catalogueId,
+                    "catalogueLevel": catalogueLevel,
+                    "coveringFromDate": coveringFromDate,
+                    "coveringToDate": coveringToDate,
+                    "chargeType": chargeType,
+                    #"eDocumentId": None,
+                    "coveringDates": coveringDates,
+                    "custodialHistory": custodialHistory,
+                    "closureCode": closureCode,
+                    "closureStatus": closureStatus,
+                    "closureType": closureType,
+                    "recordOpeningDate": recordOpeningDate,
+                    #"corporateNames": None,
+                    "copiesInformation": copiesInformation,
+                    "creatorName": creatorName,
+                    "digitised": digitised,
+                    #"dimensions": None,
+                    "formerReferenceDep": formerReferenceDep,
+                    "formerReferencePro": formerReferencePro,
+                    "heldBy": heldBy,
+                    #"immediateSourceOfAcquisition": immediateSourceOfAcquisition,
+                    "language": language,
+                    "legalStatus": legalStatus,
+                    #"links": None,
+                    "locationOfOriginals": locationOfOriginals,
+                    #"mapDesignation": None,
+                    #"mapScaleNumber": None,
+                    #"note": None,
+                    #"people": people,
+                    #"physicalCondition": physicalCondition,
+                    "physicalDescriptionExtent": physicalDescriptionExtent,
+                    "physicalDescriptionForm": physicalDescriptionForm,
+                    #"places": places,
+                    "referencePart": referencePart,
+                    "publicationNote": publicationNote,
+                    "relatedMaterial": relatedMaterial,
+                    "separatedMaterial": separatedMaterial,
+                    "restrictionsOnUse": restrictionsOnUse,
+                    "scopeContent": scopeContent,
+                    #"sortKey": None,
+                    "source": "PA",
+                    #"subjects": subjects,
+                    "title": title,
+                    "unpublishedFindingAids": unpublishedFindingAids
+                    }
+                }
+
+    # remove unnecessary fields (with null values only) if requested
+    if remove_empty_fields:
+        # prune None/empty fields from the record prior to writing JSON
+        cleaned = _clean_none_inplace(record_data)
+        if cleaned is None:
+            # ensure we still write a minimal record object if everything pruned
+            cleaned = {"record": {}}
+        elif not isinstance(cleaned, dict) or "record" not in cleaned:
+            # defensive: ensure top-level shape is preserved
+            cleaned = {"record": cleaned}
+
+        return iaid, part_of_reference, cleaned
+
+    return iaid, part_of_reference, record_data
+
+
+def _convert_record_chunk(chunk: list, remove_empty_fields: bool) -> list:
+    """Convert a chunk of serialised <record> elements inside a worker process."""
+    converted = []
+    for raw in chunk:
+        record = ET.fromstring(raw)
+        converted.append(_record_to_json(record, _index_alternative_numbers(record), remove_empty_fields))
+    return converted
+
+
+def _count_records(xml_path: str) -> int:
+    """Cheaply count <record> start tags for progress output, without parsing."""
+    count = 0
+    tail = b''
+    with open(xml_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            block = tail + block
+            count += block.count(b'<record>') + block.count(b'<record ')
+            # carry over fewer bytes than a full tag so one split across
+            # blocks is caught without counting a complete tag twice
+            tail = block[-7:]
+    return count
+
+
+def _iter_prepared_records(xml_path: str):
+    """Stream <record> elements from `xml_path` with the conversion prepass
+    applied (record levels, client filepaths, dates and languages).
+
+    Each top-level record is detached from the tree once the caller has
+    consumed it, so only the record being converted is held in memory.
+    """
+    open_records = 0
+    ancestors = []
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            ancestors.append(elem)
+            if elem.tag == 'record':
+                open_records += 1
+            continue
+
+        ancestors.pop()
+        tag = elem.tag
+        if tag == 'record':
+            open_records -= 1
+            yield elem
+            # records are flat in Axiell exports; only detach outermost ones
+            if not open_records and ancestors:
+                ancestors[-1].remove(elem)
+
+        elif tag == 'record_type':
+            neutral_value = elem.find("./value[@lang='neutral']")
+            if neutral_value is not None:
+                key = neutral_value.text.strip()
+                if key in _RECORD_LEVEL_MAPPING:
+                    neutral_value.text = str(_RECORD_LEVEL_MAPPING[key])
+
+        elif tag == 'client_filepath':
+            elem.text = "Original filepath:" + elem.text.strip()
+
+        elif tag == 'dating.date.start' or tag == 'dating.date.end':
+            if elem.text:
+                elem.text = _compact_iso_dates(elem.text)
+
+        elif tag == 'inscription.language':
+            if elem.text is not None:
+                elem.text = _format_languages(elem.text)
+
+
+# how often convert_to_json redraws its progress line
+_PROGRESS_INTERVAL = 500
+_PROGRESS_SECONDS = 0.1
 
-    ################################# subjects ##############################################################
 
-        subjects = []
-        subjects = [
-            None
-    ]
+def convert_to_json(xml_path: str, output_dir: str, remove_empty_fields: bool = True, 
+                    progress_verbose: bool = False, workers: int = 1, chunk_size: int = 256):
+    # Dictionary for parentId resolution. It is filled as records stream past,
+    # so parentIds are patched in once the whole file has been read.
+    object_number_dict = {}
+    parent_refs = []
 
-        title = record.find("Title/title")
-        title = title.text if title is not None else None
-
-    ################################### unpublishedFindingAids ###########################################################
-
-        unpublishedFindingAids_string = record.find("Finding_aids/finding_aids")
-        unpublishedFindingAids_string = unpublishedFindingAids_string.text if unpublishedFindingAids_string is not None else None
-        unpublishedFindingAids = [unpublishedFindingAids_string]
-
-    ########################################## storing XML values in JSON dictionary ###########################################
-
-        record_data = { "record": {
-                        #"$schema": "./PA_JSON_Schema.json",  # for schema validation in Visual Studio
-                        "iaid": iaid,
-                        #"replicaId": None,
-                        "citableReference": citableReference,
-                        "parentId": parentId,
-                        #"accumulationDates": None,
-                        "accruals": accruals,
-                        "accessConditions": accessConditions,
-                        "administrativeBackground": administrativeBackground,
-                        #"appraisalInformation": appraisalInformation,
-                        "arrangement": arrangement, #arrangement_system+' '+client_filepath,
-                        #"batchId": None,
-                        #"refIaid": None,
-                        "catalogueId": catalogueId,
-                        "catalogueLevel": catalogueLevel,
-                        "coveringFromDate": coveringFromDate,
-                        "coveringToDate": coveringToDate,
-                        "chargeType": chargeType,
-                        #"eDocumentId": None,
-                        "coveringDates": coveringDates,
-                        "custodialHistory": custodialHistory,
-                        "closureCode": closureCode,
-                        "closureStatus": closureStatus,
-                        "closureType": closureType,
-                        "recordOpeningDate": recordOpeningDate,
-                        #"corporateNames": None,
-                        "copiesInformation": copiesInformation,
-                        "creatorName": creatorName,
-                        "digitised": digitised,
-                        #"dimensions": None,
-                        "formerReferenceDep": formerReferenceDep,
-                        "formerReferencePro": formerReferencePro,
-                        "heldBy": heldBy,
-                        #"immediateSourceOfAcquisition": immediateSourceOfAcquisition,
-                        "language": language,
-                        "legalStatus": legalStatus,
-                        #"links": None,
-                        "locationOfOriginals": locationOfOriginals,
-                        #"mapDesignation": None,
-                        #"mapScaleNumber": None,
-                        #"note": None,
-                        #"people": people,
-                        #"physicalCondition": physicalCondition,
-                        "physicalDescriptionExtent": physicalDescriptionExtent,
-                        "physicalDescriptionForm": physicalDescriptionForm,
-                        #"places": places,
-                        "referencePart": referencePart,
-                        "publicationNote": publicationNote,
-                        "relatedMaterial": relatedMaterial,
-                        "separatedMaterial": separatedMaterial,
-                        "restrictionsOnUse": restrictionsOnUse,
-                        "scopeContent": scopeContent,
-                        #"sortKey": None,
-                        "source": "PA",
-                        #"subjects": subjects,
-                        "title": title,
-                        "unpublishedFindingAids": unpublishedFindingAids
-                        }
-                    }
+    # diagnostic counter: how many record nodes processed
+    _records_processed = 0
+    _total_records = _count_records(xml_path) if progress_verbose else 0
+    # progress is redrawn every _PROGRESS_INTERVAL records or _PROGRESS_SECONDS, not per record
+    _last_progress = time.monotonic()
 
-        def _clean_none(obj):
-            """Recursively remove None values and empty containers.
-            - dict: remove keys with None/empty; return None if dict becomes empty
-            - list: keep only cleaned items that are not None/empty; return None if list becomes empty
-            - other: return as-is (None returns None)
-            """
-            if obj is None:
-                return None
-            if isinstance(obj, dict):
-                new = {}
-                for k, v in obj.items():
-                    cv = _clean_none(v)
-                    if cv is None:
-                        continue
-                    if isinstance(cv, (list, dict)) and len(cv) == 0:
-                        continue
-                    new[k] = cv
-                return new if new else None
-            if isinstance(obj, list):
-                new_list = []
-                for item in obj:
-                    ci = _clean_none(item)
-                    if ci is None:
-                        continue
-                    if isinstance(ci, (list, dict)) and len(ci) == 0:
-                        continue
-                    new_list.append(ci)
-                return new_list if new_list else None
-            return obj
+    records = {}
 
-        # remove unnecessary fields (with null values only) if requested
-        if remove_empty_fields:
-            # prune None/empty fields from the record prior to writing JSON
-            cleaned = _clean_none(record_data)
-            if cleaned is None:
-                # ensure we still write a minimal record object if everything pruned
-                cleaned = {"record": {}}
-            elif not isinstance(cleaned, dict) or "record" not in cleaned:
-                # defensive: ensure top-level shape is preserved
-                cleaned = {"record": cleaned}
-
-            records[iaid] = cleaned
-        else:
+    def _store(converted):
+        nonlocal _records_processed, _last_progress
+        for iaid, part_of_reference, record_data in converted:
             records[iaid] = record_data
+            if part_of_reference:
+                parent_refs.append((part_of_reference, record_data))
+
+            # update diagnostics
+            _records_processed += 1
+            if progress_verbose:
+                now = time.monotonic()
+                if (_records_processed % _PROGRESS_INTERVAL == 0 or _records_processed == _total_records
+                        or now - _last_progress >= _PROGRESS_SECONDS):
+                    _last_progress = now
+                    print(f"Processed [{_records_processed - 1}/{_total_records}]: {(_records_processed/max(_total_records, 1))*100:.0f}%", end='\r')
+                    sys.stdout.flush()
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    # chunks submitted but not yet stored, in file order; capped at two per worker so
+    # the serialised records and their results do not pile up ahead of _store
+    max_pending = 2 * workers
+    try:
+        pending = deque()
+        chunk = []
+        for record in _iter_prepared_records(xml_path):
+            record_alternatives = _index_alternative_numbers(record)
+
+            object_number_elem = record.find("object_number")
+            if object_number_elem is not None and object_number_elem.text:
+                object_number = object_number_elem.text
+
+                # Find the CALM RecordID for this record
+                calm_id_elem = record_alternatives.get('CALM RecordID')
+                if calm_id_elem is not None:
+                    alt_number_elem = calm_id_elem.find('alternative_number')
+                    if alt_number_elem is not None and alt_number_elem.text:
+                        object_number_dict[object_number] = alt_number_elem.text
+
+            if executor is None:
+                _store((_record_to_json(record, record_alternatives, remove_empty_fields),))
+                continue
 
-        # update diagnostics
-        _records_processed += 1
-        if progress_verbose:
-            print(f"Processed [{i}/{_total_records}]: {(_records_processed/_total_records)*100:.0f}%", end='\r')
-            sys.stdout.flush()
+            chunk.append(ET.tostring(record))
+            if len(chunk) >= chunk_size:
+                if len(pending) >= max_pending:
+                    _store(pending.popleft().result())
+                pending.append(executor.submit(_convert_record_chunk, chunk, remove_empty_fields))
+                chunk = []
+
+        if executor is not None:
+            if chunk:
+                pending.append(executor.submit(_convert_record_chunk, chunk, remove_empty_fields))
+            while pending:
+                _store(pending.popleft().result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    for part_of_reference, record_data in parent_refs:
+        if part_of_reference in object_number_dict:
+            record_data["record"]["parentId"] = object_number_dict[part_of_reference]
 
     return records
 
 
+# a Windows (\r\n) or old Mac (\r) line break, normalised to \n in one pass
+_CRLF_RE = re.compile(r'\r\n?')
+# any single line break, for fusing normalisation with the <p> substitution
+_LINE_BREAK_RE = re.compile(r'\r\n|\r|\n')
+
+
+# exact types a JSON round trip reproduces unchanged (floats are checked for finiteness)
+_JSON_LEAF_TYPES = frozenset((str, int, bool, type(None)))
+_INF = float('inf')
+
+
+def _is_plain_json(data) -> bool:
+    """True if `data` survives a JSON round trip exactly.
+
+    That means only dicts with str keys, lists, str, int, bool, None and finite
+    floats (exact types, no subclasses), with no container reachable twice.
+    """
+    leaf_types = _JSON_LEAF_TYPES
+    seen = set()
+    stack = [data]
+    while stack:
+        cur = stack.pop()
+        t = type(cur)
+        if t is dict:
+            if id(cur) in seen:
+                return False
+            seen.add(id(cur))
+            for k, v in cur.items():
+                if type(k) is not str:
+                    return False
+                if type(v) not in leaf_types:
+                    stack.append(v)
+        elif t is list:
+            if id(cur) in seen:
+                return False
+            seen.add(id(cur))
+            for v in cur:
+                if type(v) not in leaf_types:
+                    stack.append(v)
+        elif t is float:
+            if cur != cur or cur in (_INF, -_INF):
+                return False
+        elif t not in leaf_types:
+            return False
+    return True
+
+
+def _fast_clone(data):
+    """Deep-copy a record payload, through a JSON round trip when that is exact.
+
+    Much cheaper than copy.deepcopy for plain record dicts. Anything the round
+    trip could alter (tuples, non-str keys, NaN, subclasses, shared or cyclic
+    containers, DataFrames, ...) is copied with copy.deepcopy instead.
+    """
+    if _is_plain_json(data):
+        try:
+            if orjson is not None:
+                return orjson.loads(orjson.dumps(data))
+            return json.loads(json.dumps(data))
+        except (TypeError, ValueError):
+            # e.g. integers wider than 64 bits or lone surrogates for orjson
+            pass
+    return copy.deepcopy(data)
+
+
 class NewlineToPTransformer():
     def __init__(self, target_columns: Optional[Iterable[str]] = None, match="\\n", replace="<p>"):
-        self.target_columns = target_columns
         self.match = match
         self.replace = replace
         self.regex = re.compile(self.match)
+        # width of each substituted match, for the highlight ranges
+        self._replace_len = len(self.replace) if isinstance(self.replace, str) else None
+        # plain string to replace when `match` is not really a pattern (the
+        # default "\\n" is), so str.replace can be used instead of the regex
+        self._literal = self._literal_for(self.match, self.replace)
+        self.logger = logging.getLogger("pipeline.transformers.newline_to_p")
+        # parsed (key, idx) parts of each dotted field path, keyed by path
+        self._parsed_field_paths = {}
+        self.target_columns = target_columns
         self._fitted = True
 
+    @property
+    def target_columns(self):
+        return self._target_columns
+
+    @target_columns.setter
+    def target_columns(self, target_columns):
+        """Set the fields to transform, parsing each path (and its 'record.' variant) up front.
+
+        A field path with a malformed index, e.g. 'a[0][1]' or 'a[x]', is logged once
+        and left out, so it never matches anything.
+        """
+        target_paths = []
+        for field in target_columns or ():
+            if field.startswith('record.'):
+                candidates = (field, field[len('record.'):])
+            else:
+                candidates = (field, 'record.' + field)
+            try:
+                parsed = [(candidate, self._parse_field_path(candidate)) for candidate in candidates]
+            except ValueError as e:
+                self.logger.warning("Ignoring target column '%s': %s", field, e)
+                continue
+            target_paths.extend(parsed)
+        self._target_columns = target_columns
+        self._target_paths = tuple(target_paths)
+
+    # regex escapes that stand for a single literal character
+    _LITERAL_ESCAPES = {"\\n": "\n", "\\r": "\r", "\\t": "\t"}
+
+    @classmethod
+    def _literal_for(cls, match: str, replace: str) -> Optional[str]:
+        """Return the literal text matched by `match`, or None if it needs the regex.
+
+        Replacements containing backslashes are template-expanded by re.sub, so
+        those always keep the regex path.
+        """
+        if not isinstance(replace, str) or '\\' in replace:
+            return None
+        if match in cls._LITERAL_ESCAPES:
+            return cls._LITERAL_ESCAPES[match]
+        if match and re.escape(match) == match:
+            return match
+        return None
+
+    def _match_spans(self, text: str) -> list:
+        """Return (start, end) of each non-overlapping match in `text`."""
+        literal = self._literal
+        if literal is None:
+            return [m.span() for m in self.regex.finditer(text)]
+        spans = []
+        width = len(literal)
+        start = text.find(literal)
+        while start != -1:
+            spans.append((start, start + width))
+            start = text.find(literal, start + width)
+        return spans
+
+    def _match_ranges(self, spans) -> tuple:
+        """Return (orig_ranges, trans_ranges) highlighting `spans` before and after substitution."""
+        rlen = self._replace_len if self._replace_len is not None else len(self.replace)
+        orig_ranges = [[s, e] for s, e in spans]
+        trans_ranges = []
+        offset = 0
+        for s, e in spans:
+            trans_ranges.append([s + offset, s + offset + rlen])
+            offset += rlen - (e - s)
+        return orig_ranges, trans_ranges
+
+    def _substitute(self, text: str) -> str:
+        """Replace every match in `text` with `self.replace`."""
+        if self._literal is not None:
+            return text.replace(self._literal, self.replace)
+        return self.regex.sub(self.replace, text)
+
     def fit(self, df=None, **kwargs):
         # nothing to fit for newline replacement
         self._fitted = True
@@ -725,23 +871,34 @@ class NewlineToPTransformer():
         """Apply the newline -> <p> policy to a single string."""
         if not isinstance(s, str):
             return s
+        if self._literal == '\n':
+            # default newline policy: normalise and replace every line break in
+            # one pass (\r\n, \r and \n each become a single replacement)
+            if '\r' in s:
+                return _LINE_BREAK_RE.sub(self.replace, s)
+            return s.replace('\n', self.replace)
+
         # normalize windows/newline combos to \n but do not strip whitespace
         # — we want to preserve trailing newlines so they get replaced too.
-        text = s.replace('\r\n', '\n').replace('\r', '\n')
+        text = _CRLF_RE.sub('\n', s) if '\r' in s else s
 
         try:
-            return self.regex.sub(self.replace, text)
+            return self._substitute(text)
         except Exception:
             # fallback: just replace newlines
             return re.sub(r'\n+', self.replace, text)
 
     def _walk_and_transform(self, obj):
         """Recursively walk dict/list and transform all string values in-place."""
-        if isinstance(obj, dict):
+        # exact type checks first; isinstance only for subclasses and scalars
+        t = type(obj)
+        if t is str:
+            return self._transform_string(obj)
+        if t is dict or (t is not list and isinstance(obj, dict)):
             for k, v in obj.items():
                 obj[k] = self._walk_and_transform(v)
             return obj
-        if isinstance(obj, list):
+        if t is list or isinstance(obj, list):
             for i, v in enumerate(obj):
                 obj[i] = self._walk_and_transform(v)
             return obj
@@ -751,12 +908,17 @@ class NewlineToPTransformer():
 
     @staticmethod
     def _parse_part(part: str):
-        m = re.match(r'^([^\[]+)(?:\[(\d+)\])?$', part)
-        if not m:
+        """Split 'name[idx]' into (name, int idx); anything else is (part, None)."""
+        lb = part.find('[')
+        if lb < 0:
             return part, None
-        key = m.group(1)
-        idx = int(m.group(2)) if m.group(2) is not None else None
-        return key, idx
+        # a single trailing newline is tolerated after ']', as '$' allowed before
+        body = part[:-1] if part.endswith('\n') else part
+        if lb and body.endswith(']'):
+            digits = body[lb + 1:-1]
+            if digits.isdecimal():
+                return part[:lb], int(digits)
+        return part, None
 
     def get_by_path(self, obj: Any, path: str, default: Any = None) -> Any:
         """Return value at dotted/bracket path or default if not found."""
@@ -807,62 +969,19 @@ class NewlineToPTransformer():
                 cur = cur[idx]
         return False
 
-    def transform_json(self, data: dict, target_columns: Optional[Iterable[str]] = None, json_id: Optional[int] = None, **kwargs) -> dict:
+    def transform_json(self, data: dict, target_columns: Optional[Iterable[str]] = None, json_id: Optional[int] = None,
+                       inplace: bool = False, **kwargs) -> dict:
         """
         If target_columns is None, apply newline -> <p> to every string value in the JSON (like YNaming).
         If target_columns is provided, keep existing per-field behaviour.
+        With inplace=True `data` is modified directly instead of a copy.
         """
-        payload = copy.deepcopy(data)
+        payload = data if inplace else _fast_clone(data)
 
         if target_columns is None:
-            # apply to all string fields and log transformations when json_id provided
-            def _walk_and_transform_and_log(obj, parent_path=''):
-                if isinstance(obj, dict):
-                    for k, v in list(obj.items()):
-                        path = f"{parent_path}.{k}" if parent_path else k
-                        obj[k] = _walk_and_transform_and_log(v, path)
-                    return obj
-                if isinstance(obj, list):
-                    for i, v in enumerate(list(obj)):
-                        path = f"{parent_path}[{i}]" if parent_path else f"[{i}]"
-                        obj[i] = _walk_and_transform_and_log(v, path)
-                    return obj
-                if isinstance(obj, str):
-                    original = obj
-                    new = self._transform_string(original)
-                    if new != original:
-                        # compute highlight ranges for diagnostics similar to per-field mode
-                        try:
-                            matches = list(self.regex.finditer(original))
-                            orig_ranges = []
-                            trans_ranges = []
-                            offset = 0
-                            for m in matches:
-                                s = m.start()
-                                e = m.end()
-                                orig_ranges.append([s, e])
-                                tstart = s + offset
-                                tend = tstart + len(self.replace)
-                                trans_ranges.append([tstart, tend])
-                                offset += len(self.replace) - (e - s)
-                        except Exception:
-                            orig_ranges = None
-                            trans_ranges = None
-                        #TODO:  use logger to log transformation
-                        """
-                        if json_id is not None and log_transformation:
-                            try:
-                                log_transformation(json_id, header=parent_path, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True, orig_ranges=orig_ranges, trans_ranges=trans_ranges)
-                            except Exception:
-                                try:
-                                    log_transformation(json_id, header=parent_path, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True)
-                                except Exception:
-                                    pass
-                        """
-                    return new
-                return obj
-
-            _walk_and_transform_and_log(payload, parent_path='')
+            # apply to all string fields; json_id is accepted for the (still TODO)
+            # transformation logging, so no paths are built while nothing logs them
+            self._walk_and_transform(payload)
             return payload
 
         # ...existing per-field logic when `fields` is provided...
@@ -877,10 +996,11 @@ class NewlineToPTransformer():
             # existing logging of transformation if present
         return payload
 
-    def transform(self, data, json_id=None, **kwargs):
+    def transform(self, data, json_id=None, inplace: bool = False, **kwargs):
         """Transform either a pandas DataFrame or a JSON dict.
 
         If self.fields is None the transformer applies to all string values (delegates to transform_json with fields=None).
+        Pass inplace=True when the caller owns `data` and does not need it preserved.
         """
         # If data is a DataFrame, this transformer does not operate on it
         try:
@@ -892,67 +1012,72 @@ class NewlineToPTransformer():
         if is_df:
             return data
 
-        # Work on a deepcopy of the JSON dict
-        obj = copy.deepcopy(data)
+        # Work on a copy of the JSON dict unless the caller owns it
+        obj = data if inplace else _fast_clone(data)
 
         # If no explicit fields were configured, apply to all string fields
         if not self.target_columns:
-            # forward json_id so transform_json can log per-string transformations
-            return self.transform_json(obj, target_columns=None, json_id=json_id)
+            # json_id is forwarded for the per-string transformation logging (TODO)
+            return self.transform_json(obj, target_columns=None, json_id=json_id, inplace=True)
 
-        for field in self.target_columns:
-            candidates = [field]
-            if field.startswith('record.'):
-                candidates.append(field[len('record.'):])
-            else:
-                candidates.append('record.' + field)
-
-            for candidate in candidates:
-                changed, orig_ranges, trans_ranges = self._transform_field(obj, candidate)
-                #TODO: use logger to log transformation
-                """
-                if changed and json_id is not None and log_transformation:
-                    try:
-                        log_transformation(json_id, header=candidate, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True, orig_ranges=orig_ranges, trans_ranges=trans_ranges)
-                    except Exception:
-                        log_transformation(json_id, header=candidate, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True)
-                    break
-                """
+        for candidate, parts in self._target_paths:
+            changed, orig_ranges, trans_ranges = self._transform_field(obj, parts,
+                                                                       with_ranges=json_id is not None)
+            #TODO: use logger to log transformation
+            """
+            if changed and json_id is not None and log_transformation:
+                try:
+                    log_transformation(json_id, header=candidate, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True, orig_ranges=orig_ranges, trans_ranges=trans_ranges)
+                except Exception:
+                    log_transformation(json_id, header=candidate, desc=f"Replaced '{self.match}' with '{self.replace}'", match=True)
+                break
+            """
         return obj
 
-    def _transform_field(self, obj, field_path):
-        parts = field_path.split('.')
-        cur = obj
-        for i, part in enumerate(parts):
+    def _parse_field_path(self, field_path: str) -> tuple:
+        """Split `field_path` into (key, idx) parts; idx is None for plain keys.
+
+        Parsed paths are cached. Raises ValueError for a malformed bracket part.
+        """
+        parsed = self._parsed_field_paths.get(field_path)
+        if parsed is not None:
+            return parsed
+        parts = []
+        for part in field_path.split('.'):
             if '[' in part and part.endswith(']'):
-                name, idx = part[:-1].split('[')
                 try:
+                    name, idx = part[:-1].split('[')
                     idx = int(idx)
-                except Exception:
-                    return False, None, None
-                if name:
-                    cur = cur.get(name, []) if isinstance(cur, dict) else None
+                except ValueError:
+                    raise ValueError(f"Invalid index in field path {field_path!r}: {part!r}") from None
+                parts.append((name, idx))
+            else:
+                parts.append((part, None))
+        parsed = self._parsed_field_paths[field_path] = tuple(parts)
+        return parsed
+
+    def _transform_field(self, obj, parts, with_ranges: bool = True):
+        """Apply the substitution to the string at the parsed field path `parts`.
+
+        Returns (changed, orig_ranges, trans_ranges); the ranges are None unless
+        `with_ranges` is set and something changed.
+        """
+        cur = obj
+        for i, (part, idx) in enumerate(parts):
+            if idx is not None:
+                if part:
+                    cur = cur.get(part, []) if isinstance(cur, dict) else None
                 if isinstance(cur, list) and len(cur) > idx:
                     if i == len(parts) - 1:
                         if isinstance(cur[idx], str):
                             original = cur[idx]
-                            matches = list(self.regex.finditer(original))
+                            matches = self._match_spans(original)
                             if not matches:
                                 return False, None, None
-                            new = self.regex.sub(self.replace, original)
-                            orig_ranges = []
-                            trans_ranges = []
-                            offset = 0
-                            for m in matches:
-                                s = m.start()
-                                e = m.end()
-                                orig_ranges.append([s, e])
-                                tstart = s + offset
-                                tend = tstart + len(self.replace)
-                                trans_ranges.append([tstart, tend])
-                                offset += len(self.replace) - (e - s)
-                            cur[idx] = new
-                            return True, orig_ranges, trans_ranges
+                            cur[idx] = self._substitute(original)
+                            if not with_ranges:
+                                return True, None, None
+                            return (True,) + self._match_ranges(matches)
                     else:
                         cur = cur[idx]
                 else:
@@ -961,28 +1086,26 @@ class NewlineToPTransformer():
                 if i == len(parts) - 1:
                     if isinstance(cur, dict) and part in cur and isinstance(cur[part], str):
                         original = cur[part]
-                        matches = list(self.regex.finditer(original))
+                        matches = self._match_spans(original)
                         if not matches:
                             return False, None, None
-                        new = self.regex.sub(self.replace, original)
-                        orig_ranges = []
-                        trans_ranges = []
-                        offset = 0
-                        for m in matches:
-                            s = m.start()
-                            e = m.end()
-                            orig_ranges.append([s, e])
-                            tstart = s + offset
-                            tend = tstart + len(self.replace)
-                            trans_ranges.append([tstart, tend])
-                            offset += len(self.replace) - (e - s)
-                        cur[part] = new
-                        return True, orig_ranges, trans_ranges
+                        cur[part] = self._substitute(original)
+                        if not with_ranges:
+                            return True, None, None
+                        return (True,) + self._match_ranges(matches)
                 else:
                     cur = cur.get(part, None) if isinstance(cur, dict) else None
         return False, None, None
 
 
+# patterns used by YNamingTransformer._is_reference_like
+_BARE_TOKEN_RE = re.compile(r'[A-Z]{1,4}')
+_APT_RE = re.compile(r'\bAPT/', re.IGNORECASE)
+_SHORT_TOKEN_RE = re.compile(r'\b([A-Z]{1,4})\b')
+# JSON leaf types that Y-naming never touches; skipped without an isinstance call
+_JSON_SCALAR_TYPES = frozenset((int, float, bool, type(None)))
+
+
 class YNamingTransformer():
     """Transformer for applying Y naming conventions."""
 
@@ -999,6 +1122,11 @@ class YNamingTransformer():
         self._refs = None
         # Exclusion patterns (compiled regexes) to skip Y-naming for specific contextual phrases
         self._exclusion_patterns = []
+        # apply_if_reference results by input string; depends on the refs and
+        # exclusions, so the set_* methods clear it
+        self._apply_cache = {}
+        # Y-named prefix by raw prefix token (None: not alphabetic, left unchanged)
+        self._prefix_cache = {}
         if ref_set is not None:
             try:
                 self.set_definitive_refs(ref_set)
@@ -1011,6 +1139,7 @@ class YNamingTransformer():
         Accepts an iterable of strings (or None). Normalises to upper-case stripped strings.
         Returns self to allow fluent usage.
         """
+        self._apply_cache.clear()
         if refs is None:
             self._refs = None
             return self
@@ -1041,8 +1170,8 @@ class YNamingTransformer():
                         vals = [v for v in refs.values() if isinstance(v, str)]
                         refs = vals
 
-            # Finally, normalise iterable of strings into a set
-            self._refs = {r.strip().upper() for r in refs if isinstance(r, str) and r.strip()}
+            # Finally, normalise iterable of strings into an immutable set of interned codes
+            self._refs = frozenset(sys.intern(r.strip().upper()) for r in refs if isinstance(r, str) and r.strip())
             try:
                 self.logger.debug("set_definitive_refs normalized refs count: %s", None if self._refs is None else len(self._refs))
             except Exception:
@@ -1067,6 +1196,7 @@ class YNamingTransformer():
             self for fluent chaining
         """
         self._exclusion_patterns = []
+        self._apply_cache.clear()
         if not exclusions:
             return self
         
@@ -1105,12 +1235,63 @@ class YNamingTransformer():
                 return True
         return False
 
-    def transform(self, data, json_id=None, **kwargs):
+    def transform(self, data, json_id=None, inplace: bool = False, **kwargs):
+        # DataFrames are transformed column-wise (JSON dicts skip the pandas probe)
+        is_df = False
+        if not isinstance(data, dict):
+            try:
+                import pandas as pd
+                is_df = isinstance(data, pd.DataFrame)
+            except Exception:
+                is_df = False
+
+        if is_df:
+            return self._transform_dataframe(data, inplace=inplace)
+
         # Delegate to transform_json; apply to all if target_columns is None
-        return self.transform_json(data, target_columns=self.target_columns, json_id=json_id)
+        return self.transform_json(data, target_columns=self.target_columns, json_id=json_id, inplace=inplace)
+
+    def _transform_dataframe(self, df, inplace: bool = False):
+        """Apply Y-naming to the target columns of a DataFrame.
+
+        Target columns are matched with or without the 'record.' prefix; with no
+        target columns configured every object (string) column is transformed.
+        """
+        out = df if inplace else df.copy()
+        if self.target_columns is None:
+            columns = [col for col in out.columns if out[col].dtype == object]
+        else:
+            columns = []
+            for field in self.target_columns:
+                candidates = [field]
+                if field.startswith('record.'):
+                    candidates.append(field[len('record.'):])
+                else:
+                    candidates.append('record.' + field)
+                for candidate in candidates:
+                    if candidate in out.columns:
+                        columns.append(candidate)
+                        break
+        for col in columns:
+            out[col] = self._transform_series(out[col])
+        return out
+
+    def _transform_series(self, series):
+        """Apply Y-naming to every value of a Series; non-strings pass through unchanged."""
+        import pandas as pd
+        apply = self.apply_if_reference
+        return pd.Series([apply(v) for v in series.values], index=series.index, name=series.name, dtype=object)
 
     # regex to find embedded candidate tokens: requires at least one slash
     _embedded_token_re = re.compile(r'([A-Z0-9-]+(?:/[A-Z0-9-]+)+/?)')
+    # regex to find bare short tokens (e.g. "BBK") inside text
+    _short_token_re = _SHORT_TOKEN_RE
+
+    # apply_if_reference only remembers strings up to _APPLY_CACHE_MAX_LEN characters
+    # (references and other short values), and stops adding once _APPLY_CACHE_MAX are held,
+    # which keeps the cache under ten megabytes whatever the input
+    _APPLY_CACHE_MAX = 32768
+    _APPLY_CACHE_MAX_LEN = 64
 
     def apply_if_reference(self, text: str) -> str:
         """
@@ -1119,24 +1300,33 @@ class YNamingTransformer():
         
         Uses position-aware exclusion checking: only skips Y-prefix for tokens that fall
         within excluded contextual phrases (e.g., "(their ref: DL.MEL)").
-        """
 
+        Results for short strings are memoised per instance, as records repeat the
+        same reference values heavily.
+        """
+        if type(text) is not str or len(text) > self._APPLY_CACHE_MAX_LEN:
+            return self._apply_if_reference(text)
+        cache = self._apply_cache
+        new = cache.get(text)
+        if new is None:
+            new = self._apply_if_reference(text)
+            if len(cache) < self._APPLY_CACHE_MAX:
+                cache[text] = new
+        return new
+
+    def _apply_if_reference(self, text: str) -> str:
+        """Uncached body of apply_if_reference."""
         if not isinstance(text, str):
             return text
-        
-        # Build list of exclusion spans (start, end positions) in the original text
-        exclusion_spans = []
-        if self._exclusion_patterns:
-            for pattern in self._exclusion_patterns:
-                try:
-                    for match in pattern.finditer(text):
-                        exclusion_spans.append((match.start(), match.end()))
-                except Exception:
-                    continue
-        
+
+        # Build list of exclusion spans (start, end positions) in the original text;
+        # only needed once the text is known to be a candidate for replacement
+        exclusion_spans = None
+
         # If the whole field is a canonical reference-like string, handle as before
         # but check if the entire string is within an exclusion span
         if self._is_reference_like(text):
+            exclusion_spans = self._exclusion_spans(text)
             # Check if entire text is excluded
             if exclusion_spans and any(start == 0 and end >= len(text) for start, end in exclusion_spans):
                 return text
@@ -1151,6 +1341,13 @@ class YNamingTransformer():
                 return self._apply_y_naming(text)
             # not a member of definitive set; fall through to embedded replacement
 
+        # Embedded tokens need a slash, and bare short tokens are only replaced
+        # when a definitive set is loaded; without either there is nothing to do
+        if not self._refs and '/' not in text:
+            return text
+        if exclusion_spans is None:
+            exclusion_spans = self._exclusion_spans(text)
+
         # Otherwise, attempt to find embedded reference-like tokens anywhere in the text
         # Pass exclusion spans so token-level checking can skip excluded positions
         try:
@@ -1164,6 +1361,18 @@ class YNamingTransformer():
             return text
 
 
+    def _exclusion_spans(self, text: str) -> list:
+        """Return (start, end) of every exclusion pattern match in `text`."""
+        exclusion_spans = []
+        if self._exclusion_patterns:
+            for pattern in self._exclusion_patterns:
+                try:
+                    for match in pattern.finditer(text):
+                        exclusion_spans.append((match.start(), match.end()))
+                except Exception:
+                    continue
+        return exclusion_spans
+
     def _replace_embedded_references(self, text: str, exclusion_spans: list = None) -> str:
         """Find embedded reference-like tokens in `text` and replace each with its Y-named equivalent.
 
@@ -1181,65 +1390,74 @@ class YNamingTransformer():
 
         if not isinstance(text, str):
             return text
-        
-        if exclusion_spans is None:
-            exclusion_spans = []
-        
-        # Helper: check if a match position overlaps any exclusion span
-        def is_position_excluded(match_start: int, match_end: int) -> bool:
-            for ex_start, ex_end in exclusion_spans:
-                # Check if match overlaps with exclusion span
-                if not (match_end <= ex_start or match_start >= ex_end):
-                    return True
-            return False
 
-        def repl(m: re.Match) -> str:
-            token = m.group(1)
-            # Check if this token's position is within an excluded span
-            if is_position_excluded(m.start(), m.end()):
-                return token
-            
-            # quick syntactic check on the token itself
-            if not self._is_reference_like(token):
-                return token
-            # membership check if definitive set loaded
-            if self._refs is not None:
-                if self._membership_ok(token):
-                    return self._apply_y_naming(token)
-                return token
-            # no definitive set loaded: apply algorithmic transform
-            return self._apply_y_naming(token)
+        repl = self._repl_embedded
+        repl_short = self._repl_short
 
-        # Use sub with function to handle multiple occurrences and preserve other text
-        out = self._embedded_token_re.sub(repl, text)
+        # Only wrap the replacers when there are spans to check against
+        if exclusion_spans:
+            # Helper: check if a match position overlaps any exclusion span
+            def is_position_excluded(match_start: int, match_end: int) -> bool:
+                for ex_start, ex_end in exclusion_spans:
+                    # Check if match overlaps with exclusion span
+                    if not (match_end <= ex_start or match_start >= ex_end):
+                        return True
+                return False
 
-        # If we have definitive refs, also replace short bare tokens inside text
-        # (e.g. "... BBK ...") but only when the token is in the definitive set.
-        if self._refs:
-            short_re = re.compile(r'\b([A-Z]{1,4})\b')
+            def repl(m: re.Match) -> str:
+                # Check if this token's position is within an excluded span
+                if is_position_excluded(m.start(), m.end()):
+                    return m.group(1)
+                return self._repl_embedded(m)
 
             def repl_short(m: re.Match) -> str:
-                tok = m.group(1)
                 # Check if this token's position is within an excluded span
                 if is_position_excluded(m.start(), m.end()):
-                    return tok
-                
-                if self._membership_ok(tok) and self._is_reference_like(tok):
-                    return self._apply_y_naming(tok)
-                return tok
+                    return m.group(1)
+                return self._repl_short(m)
 
-            out = short_re.sub(repl_short, out)
+        # Use sub with function to handle multiple occurrences and preserve other text;
+        # every candidate token contains a slash, so skip the scan when there is none
+        out = self._embedded_token_re.sub(repl, text) if '/' in text else text
+
+        # If we have definitive refs, also replace short bare tokens inside text
+        # (e.g. "... BBK ...") but only when the token is in the definitive set.
+        if self._refs:
+            out = self._short_token_re.sub(repl_short, out)
 
         return out
 
+    def _repl_embedded(self, m: re.Match) -> str:
+        """re.sub callback: Y-name an embedded slash token if it is a reference."""
+        token = m.group(1)
+        # quick syntactic check on the token itself
+        if not self._is_reference_like(token):
+            return token
+        # membership check if definitive set loaded
+        if self._refs is not None:
+            if self._membership_ok(token):
+                return self._apply_y_naming(token)
+            return token
+        # no definitive set loaded: apply algorithmic transform
+        return self._apply_y_naming(token)
+
+    def _repl_short(self, m: re.Match) -> str:
+        """re.sub callback: Y-name a bare short token if it is in the definitive set."""
+        tok = m.group(1)
+        if self._membership_ok(tok) and self._is_reference_like(tok):
+            return self._apply_y_naming(tok)
+        return tok
+
     # ----- JSON-dict transform API for pipeline runtime -----
-    def transform_json(self, data: dict, target_columns: Optional[List[str]] = None, json_id: Optional[int] = None) -> dict:
+    def transform_json(self, data: dict, target_columns: Optional[List[str]] = None, json_id: Optional[int] = None,
+                       inplace: bool = False) -> dict:
         """Apply Y-naming to a JSON dict for the given field paths and log changes.
 
         fields: list of dotted field paths like 'record.title' or 'record.relatedMaterial[0].description'
         If fields is None, apply to ALL string values in the JSON recursively.
+        With inplace=True `data` is modified directly instead of a copy.
         """
-        obj = copy.deepcopy(data)
+        obj = data if inplace else _fast_clone(data)
 
         # Important: treat fields=None as the signal to apply to ALL string values.
         # If caller passes an explicit list (possibly empty), only those fields are processed.
@@ -1283,11 +1501,7 @@ class YNamingTransformer():
                         return True
                     return False
                 if isinstance(val, (dict, list)):
-                    # snapshot before
-                    before = json.dumps(val, ensure_ascii=False, sort_keys=True) if isinstance(val, dict) else str(val)
-                    self._transform_all_strings_json(val, json_id=None)
-                    after = json.dumps(val, ensure_ascii=False, sort_keys=True) if isinstance(val, dict) else str(val)
-                    return before != after
+                    return self._transform_all_strings_json(val, json_id=None) > 0
                 return False
             else:
                 cur = val
@@ -1373,20 +1587,31 @@ class YNamingTransformer():
         4. If reference already starts with 'Y', don't add another Y (prevent double-application)
         """
 
-        if not isinstance(text, str) or not text.strip():
+        if not isinstance(text, str):
             return text
 
         ref = text.strip()
         if not ref:
             return text
 
-        # Split by slash to get the prefix (letter code)
-        parts = ref.split('/')
-        if len(parts) == 0:
+        # Split off the prefix (letter code) at the first slash
+        head, sep, rest = ref.partition('/')
+        try:
+            new_prefix = self._prefix_cache[head]
+        except KeyError:
+            new_prefix = self._prefix_cache[head] = self._y_prefix(head)
+
+        if new_prefix is None:
             return text
 
-        prefix = parts[0].strip().upper()
-        suffix = '/' + '/'.join(parts[1:]) if len(parts) > 1 else ''
+        suffix = '/' + rest if sep else ''
+        result = new_prefix + suffix
+        return result
+
+    @staticmethod
+    def _y_prefix(head: str) -> Optional[str]:
+        """Return the Y-named form of a raw prefix token, or None if it must be left alone."""
+        head = head.strip()
 
         # Apply naming rules
         # Only apply Y-prefixing for prefixes that are purely alphabetic.
@@ -1394,26 +1619,23 @@ class YNamingTransformer():
         # or alphanumeric (e.g. '3' or 'PLAN1852'). If the prefix contains any
         # digits or non-alpha characters we conservatively leave the reference
         # unchanged.
-        if not parts[0].strip().isalpha():
-            return text
+        if not head.isalpha():
+            return None
+
+        prefix = head.upper()
 
         if prefix == 'PARL':
             # Special case: PARL → YUKP
-            new_prefix = 'YUKP'
-        elif prefix.startswith('Y'):
+            return 'YUKP'
+        if prefix.startswith('Y'):
             # Already has Y prefix - don't add another Y to prevent double-application
-            new_prefix = prefix
-        else:
-            # Add Y prefix to the letter code
-            temp_prefix = 'Y' + prefix
-            # CRITICAL 5-LETTER RULE: If adding Y makes it exceed 4 characters, trim the last character
-            if len(temp_prefix) > 4:
-                new_prefix = temp_prefix[:4]  # Keep only first 4 characters (Y + first 3 of original)
-            else:
-                new_prefix = temp_prefix
-
-        result = new_prefix + suffix
-        return result
+            return prefix
+        # Add Y prefix to the letter code
+        temp_prefix = 'Y' + prefix
+        # CRITICAL 5-LETTER RULE: If adding Y makes it exceed 4 characters, trim the last character
+        if len(temp_prefix) > 4:
+            return temp_prefix[:4]  # Keep only first 4 characters (Y + first 3 of original)
+        return temp_prefix
 
     def _membership_ok(self, token: str) -> bool:
         """Central membership helper.
@@ -1437,30 +1659,49 @@ class YNamingTransformer():
             return False
         return t in self._refs
 
-    def _transform_all_strings_json(self, obj, json_id):
-        """Recursively apply Y-naming to all string values in the JSON object."""
-        def _recurse_and_transform(current_obj, path=""):
-            if isinstance(current_obj, dict):
-                for key, value in current_obj.items():
-                    current_path = f"{path}.{key}" if path else key
-                    if isinstance(value, str):
-                        original = value
-                        new = self.apply_if_reference(original)
-                        if new != original:
-                            current_obj[key] = new
-                    else:
-                        _recurse_and_transform(value, current_path)
-            elif isinstance(current_obj, list):
-                for i, item in enumerate(current_obj):
-                    current_path = f"{path}[{i}]"
-                    if isinstance(item, str):
-                        original = item
-                        new = self.apply_if_reference(original)
-                        if new != original:
-                            current_obj[i] = new
-                    else:
-                        _recurse_and_transform(item, current_path)
-        _recurse_and_transform(obj)
+    def _transform_all_strings_json(self, obj, json_id) -> int:
+        """Apply Y-naming to all string values in the JSON object, in place.
+
+        The tree is scanned read-only first (_collect_changes) and the new values
+        are assigned afterwards, so no container is written while being iterated.
+        Returns the number of string values that were changed.
+        """
+        changes = []
+        self._collect_changes(obj, changes)
+        for container, key, new in changes:
+            container[key] = new
+        return len(changes)
+
+    def _collect_changes(self, obj, out: list) -> None:
+        """Append (container, key_or_index, new_value) to `out` for every string Y-naming changes.
+
+        Containers are walked with an explicit stack rather than recursion.
+        """
+        if not isinstance(obj, (dict, list)):
+            return
+        apply = self.apply_if_reference
+        scalars = _JSON_SCALAR_TYPES
+        stack = [obj]
+        while stack:
+            current = stack.pop()
+            entries = current.items() if isinstance(current, dict) else enumerate(current)
+            for key, value in entries:
+                t = type(value)
+                if t is str:
+                    new = apply(value)
+                    if new != value:
+                        out.append((current, key, new))
+                elif t is dict or t is list:
+                    stack.append(value)
+                elif t in scalars:
+                    continue
+                # subclasses of the container/str types fall back to isinstance
+                elif isinstance(value, str):
+                    new = apply(value)
+                    if new != value:
+                        out.append((current, key, new))
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
 
     def _is_reference_like(self, s: str) -> bool:
         """Returns True if the string `s` is syntactically similar to a citable reference.
@@ -1475,11 +1716,13 @@ class YNamingTransformer():
         
         # allow special-case tokens like PARL to be accepted via membership helper
 
-        # Reject if more than 9 slashes (invalid reference)
-        if t.count('/') > 9:
+        # Reject if more than 9 slashes (invalid reference); strip() never
+        # removes a slash, so this count holds for `s` as well
+        slash_count = t.count('/')
+        if slash_count > 9:
             return False
         
-        if re.fullmatch(r'[A-Z]{1,4}', t):
+        if _BARE_TOKEN_RE.fullmatch(t):
             # If definitive refs loaded, require membership of the bare token via helper.
             if self._refs is not None:
                 return self._membership_ok(t)
@@ -1488,11 +1731,11 @@ class YNamingTransformer():
 
         # explicit exclusion: any token starting with "APT/" should be rejected (case-insensitive)
         # We use a word boundary before APT to avoid matching inside longer tokens like CAPT/.
-        if re.search(r'(?i)\bAPT/', orig):
+        if _APT_RE.search(orig):
             return False
         
         # Embedded short token inside other text (e.g. "(see FLS)")
-        m = re.search(r'\b([A-Z]{1,4})\b', t)
+        m = _SHORT_TOKEN_RE.search(t)
         if m and (m.group(1) != t):
             # Accept embedded uppercase tokens; if definitive refs loaded,
             # require membership via helper.
@@ -1501,31 +1744,25 @@ class YNamingTransformer():
                 return self._membership_ok(token)
             return True
 
-        # check that the token contains 1 to 9 slashes
-        slash_count = s.count('/')
-        if slash_count < 1 or slash_count > 9:
+        # check that the token contains at least one slash (the upper bound is checked above)
+        if not slash_count:
             return False
 
-        raw_toks = s.split('/')
-        toks = [t.strip() for t in raw_toks]
-        if len(toks) < 2 or len(toks) > 10:
+        # Every token must be non-empty and made of ASCII letters, digits and hyphens
+        # only (so no whitespace around tokens, e.g. ' DEF'): check the whole string
+        # at once, with '-' and '/' mapped to a letter so isalnum covers them
+        if s[0] == '/' or s[-1] == '/' or '//' in s:
+            return False
+        if not (s.isascii() and s.replace('-', 'a').replace('/', 'a').isalnum()):
             return False
-
-        # Reject if any token had leading/trailing whitespace originally (e.g. ' DEF')
-        for raw, tok in zip(raw_toks, toks):
-            if raw != tok:
-                return False
-            if tok == '':
-                return False
-            if not re.match(r'^[A-Za-z0-9-]+$', tok):
-                return False
 
         # Additional rule: first (prefix) token must be purely alphabetic (no digits or hyphens)
         # This enforces rejection of examples like 'XYZ-12/ABC-3' and 'A1B2C3/456'.
-        if not re.match(r'^[A-Za-z]+$', toks[0]):
+        prefix = s[:s.index('/')]
+        if not prefix.isalpha():
             return False
-        # Prefix must be at least 1 alphabetic character (reject empty like '/1').
-        return (len(toks[0]) > 1) or (toks[0] == 'S')
+        # Single-letter prefixes are only accepted for 'S'.
+        return len(prefix) > 1 or prefix == 'S'
 
 
 class ReplicaDataTransformer:
@@ -1576,7 +1813,6 @@ class ReplicaDataTransformer:
         try:
             from botocore.exceptions import ClientError
             resp = self.s3.get_object(Bucket=self.bucket, Key=key)
-            import json
             body = resp.get('Body')
             if not body:
                 return None
@@ -1584,7 +1820,7 @@ class ReplicaDataTransformer:
             if not raw:
                 return None
             try:
-                data = json.loads(raw.decode('utf-8'))
+                data = loads_json(raw)
             except Exception as e:
                 self.logger.debug("Invalid JSON for replica %s: %s", iaid, e)
                 return None
@@ -10,17 +10,34 @@ Includes:
 from __future__ import annotations
 
 import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import xml.etree.ElementTree as ET
 from typing import Iterable, List, Optional, Sequence, Union
 from dotenv import load_dotenv
 import contextlib
+import fnmatch
+import functools
+import hashlib
+import io
+import itertools
 import time
 import logging
 from datetime import datetime, timedelta
 import json
+import math
 import time as pytime
-from collections import OrderedDict
+from collections import OrderedDict, deque
+
+try:
+    import orjson
+except ImportError:  # optional accelerator; the stdlib json module is used instead
+    orjson = None
+
+# module logger for helpers that are not handed one by the caller
+_log = logging.getLogger(__name__)
 
 
 def get_trans_config(logger: Optional[logging.Logger] = None):
@@ -44,7 +61,8 @@ def get_trans_config(logger: Optional[logging.Logger] = None):
     """
     if logger is None:
         logger = logging.getLogger(__name__)
-    
+    ensure_env_loaded()
+
     # Load TRANS_CONFIG from environment variable only (project policy)
     env_value = os.getenv("TRANS_CONFIG")
     if not env_value:
@@ -73,14 +91,47 @@ def get_trans_config(logger: Optional[logging.Logger] = None):
 
 
 def find_key(obj, target):
+    """Yield every value stored under key `target` in nested dicts/lists, in document order.
+
+    Walks the structure with an explicit stack of iterators rather than recursion.
+    """
     if isinstance(obj, dict):
-        for k, v in obj.items():
-            if k == target:
-                yield v
-            yield from find_key(v, target)
+        stack = [(True, iter(obj.items()))]
     elif isinstance(obj, list):
-        for item in obj:
-            yield from find_key(item, target)
+        stack = [(False, iter(obj))]
+    else:
+        return
+    while stack:
+        is_dict, entries = stack[-1]
+        for entry in entries:
+            if is_dict:
+                k, v = entry
+                if k == target:
+                    yield v
+            else:
+                v = entry
+            # descend before moving on to the next sibling; exact type checks
+            # first so scalar leaves skip the isinstance calls
+            t = type(v)
+            if t is str:
+                continue
+            if t is dict or (t is not list and isinstance(v, dict)):
+                stack.append((True, iter(v.items())))
+                break
+            if t is list or isinstance(v, list):
+                stack.append((False, iter(v)))
+                break
+        else:
+            stack.pop()
+
+
+def _split_duration(seconds: float):
+    """Split `seconds` into whole hours, whole minutes and the remaining seconds."""
+    if seconds < 60:
+        return 0, 0, seconds
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return int(h), int(m), s
 
 
 @contextlib.contextmanager
@@ -101,29 +152,32 @@ def log_timing(operation_name: str, logger: Optional[logging.Logger] = None):
     if logger is None:
         logger = logging.getLogger(__name__)
     start_perf = time.perf_counter()
-    start_wall = datetime.now().isoformat()
-    logger.info("Started %s at %s", operation_name, start_wall)
+    # timestamps are only built when the message will actually be emitted
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Started %s at %s", operation_name, datetime.now().isoformat())
     try:
         yield
     except Exception as exc:
-        duration = time.perf_counter() - start_perf
-        h, rem = divmod(duration, 3600)
-        m, s = divmod(rem, 60)
-        end_wall = datetime.now().isoformat()
-        logger.error(
-            "Failed %s at %s (duration %dh %dm %.2fs): %s",
-            operation_name, end_wall, int(h), int(m), s, exc
-        )
+        if logger.isEnabledFor(logging.ERROR):
+            h, m, s = _split_duration(time.perf_counter() - start_perf)
+            end_wall = datetime.now().isoformat()
+            logger.error(
+                "Failed %s at %s (duration %dh %dm %.2fs): %s",
+                operation_name, end_wall, h, m, s, exc
+            )
         raise
     else:
-        duration = time.perf_counter() - start_perf
-        h, rem = divmod(duration, 3600)
-        m, s = divmod(rem, 60)
-        end_wall = datetime.now().isoformat()
-        logger.info(
-            "Finished %s at %s (duration %dh %dm %.2fs)",
-            operation_name, end_wall, int(h), int(m), s
-        )
+        if logger.isEnabledFor(logging.INFO):
+            h, m, s = _split_duration(time.perf_counter() - start_perf)
+            end_wall = datetime.now().isoformat()
+            logger.info(
+                "Finished %s at %s (duration %dh %dm %.2fs)",
+                operation_name, end_wall, h, m, s
+            )
+
+
+# minimum gap between stdout flushes for progress_context's in-place lines
+_PROGRESS_FLUSH_SECONDS = 0.2
 
 
 @contextlib.contextmanager
@@ -143,14 +197,23 @@ def progress_context(total: int, interval: int = 500,
         return (f"{label} [{done}/{total}] ({done/total*100:.0f}%) | "
                 f"Rate: {rate:.0f}/min | ETA ~ {eta_str}    ")
     
+    # '\r' lines never trigger a line-buffered flush, so flush explicitly, but
+    # at most every _PROGRESS_FLUSH_SECONDS
+    last_flush = start
+
     def tick(done: int):
+        nonlocal last_flush
         if not verbose:
             return
         if done == total:
             return
         if done and interval and (done % interval == 0):
-            elapsed = pytime.time() - start
-            print(_format_line(done, elapsed), end='\r')
+            now = pytime.time()
+            out = sys.stdout
+            out.write(_format_line(done, now - start) + '\r')
+            if now - last_flush >= _PROGRESS_FLUSH_SECONDS:
+                out.flush()
+                last_flush = now
     
     try:
         yield tick
@@ -168,22 +231,34 @@ def progress_context(total: int, interval: int = 500,
 # helper to format duration
 def _fmt_duration(seconds: float) -> str:
     seconds = max(0.0, seconds)
+    # most operations are short: only split out the units that are present
+    if seconds < 60:
+        return f"{seconds:.2f}s"
+    if seconds < 3600:
+        m, s = divmod(seconds, 60)
+        return f"{int(m)}m {s:.1f}s"
     # use mod to get remainders for formatting (so we don't get more than 60 minutes etc)
     h, rem = divmod(seconds, 3600)
     m, s = divmod(rem, 60)
-    if h:
-        return f"{int(h)}h {int(m)}m {s:.1f}s"
-    if m:
-        return f"{int(m)}m {s:.1f}s"
-    return f"{s:.2f}s"
+    return f"{int(h)}h {int(m)}m {s:.1f}s"
+
+@functools.lru_cache(maxsize=1)
+def ensure_env_loaded() -> None:
+    """Load ``.env`` from the working directory once per process.
 
-# List of XML files to merge
-load_dotenv(Path.cwd() / ".env")
+    Importing this module does not read ``.env``; entry points that read
+    environment variables at import time (run_pipeline) call this first.
+    """
+    load_dotenv(Path.cwd() / ".env")
 
 
 # ---------------------------------------------------------------------------
 # XML merge helpers
 # ---------------------------------------------------------------------------
+# repository root, resolved once (src/ lives directly under it)
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
 def get_triggers_dir(env_var: str = "CTD_DATA_INPUT") -> Path:
     """Return the triggers directory path.
 
@@ -191,11 +266,17 @@ def get_triggers_dir(env_var: str = "CTD_DATA_INPUT") -> Path:
     <repo-root>/data/triggers where <repo-root> is discovered from the
     current file location.
     """
-    env_val = os.getenv(env_var)
+    ensure_env_loaded()
+    return _resolve_triggers_dir(os.getenv(env_var))
+
+
+@functools.lru_cache(maxsize=4)
+def _resolve_triggers_dir(env_val: Optional[str]) -> Path:
+    """Resolve the triggers directory for a given env value (memoised per value)."""
     if env_val:
         p = Path(env_val)
-        return p if p.is_absolute() else (Path(__file__).resolve().parents[1] / p).resolve()
-    return Path(__file__).resolve().parents[1] / "data" / "triggers"
+        return p if p.is_absolute() else (_REPO_ROOT / p).resolve()
+    return _REPO_ROOT / "data" / "triggers"
 
 
 def list_xml_files(
@@ -214,26 +295,86 @@ def list_xml_files(
     files: List[Path] = []
     if filenames:
         for name in filenames:
-            p = Path(name)
-            if not p.is_absolute():
-                p = base / p
-            if p.exists() and p.is_file():
+            # one Path per name: joining onto base keeps absolute names as-is
+            p = Path(base, name)
+            if p.is_file():  # a single stat; is_file() is False for missing paths
                 files.append(p)
         return files
     # Glob all by pattern
-    if base.exists():
+    if not base.exists():
+        return files
+    if not pattern or "/" in pattern or os.sep in pattern or "**" in pattern:
         files.extend(sorted(base.glob(pattern)))
+        return files
+    # a plain name pattern only needs one directory read; scandir avoids the
+    # per-entry Path objects that glob builds before matching
+    try:
+        with os.scandir(base) as it:
+            files.extend(sorted(Path(e.path) for e in it if fnmatch.fnmatch(e.name, pattern)))
+    except NotADirectoryError:
+        pass
     return files
 
 
+def _iter_root_children(path: Union[str, Path], tag: str) -> List[ET.Element]:
+    """Return the direct children of the root of `path` whose tag is `tag`.
+
+    The file is streamed with iterparse and each child is detached from the root
+    once complete, so subtrees with other tags are freed straight away instead
+    of the whole document being held in memory.
+    """
+    children = []
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(str(path), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            if elem.tag == tag:
+                children.append(elem)
+            root.remove(elem)
+    return children
+
+
+def _write_merged_xml(out: Path, root_tag: str, children: Iterable[ET.Element]) -> int:
+    """Stream `children` to `out` under a new `root_tag` element; returns the count written.
+
+    Produces the same bytes as ``ElementTree.write(out, encoding="utf-8",
+    xml_declaration=True)`` on the equivalent merged tree, except that any
+    namespace declarations are made on each child rather than on the root.
+    """
+    written = 0
+    with open(out, "w", encoding="utf-8", errors="xmlcharrefreplace") as fh:
+        fh.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        for child in children:
+            if not written:
+                fh.write(f"<{root_tag}>")
+            # serialise straight into the file rather than via a tostring() copy
+            ET.ElementTree(child).write(fh, encoding="unicode")
+            written += 1
+        fh.write(f"</{root_tag}>" if written else f"<{root_tag} />")
+    return written
+
+
+# merge_xml_files keeps only files whose path mentions one of these, in any case
+# (ASCII case folding gives the same answer as matching on str.lower())
+_TRIGGER_KEEP_RE = re.compile(r'fonds|series|item|file', re.IGNORECASE | re.ASCII)
+
+
 def merge_xml_files(
     triggers_dir: Optional[Union[str, Path]] = None,
     *,
     filenames: Optional[Sequence[Union[str, Path]]] = None,
     root_tag: str = "MergedData",
     child_root_tag: Optional[str] = None,
-    output_path: Optional[Union[str, Path]] = None
-) -> ET.ElementTree:
+    output_path: Optional[Union[str, Path]] = None,
+    max_workers: int = 1,
+    keep_tree: bool = True
+) -> Optional[ET.ElementTree]:
     """Merge multiple XML files from the triggers directory into one tree.
 
     Parameters
@@ -249,49 +390,146 @@ def merge_xml_files(
         are appended. Otherwise all direct children of each root are appended.
     output_path : path-like | None
         If given, write merged XML to this path (directories auto-created).
+    max_workers : int
+        Number of threads reading and parsing files concurrently. Children are
+        always appended in file order, and at most ``max_workers`` parsed
+        files are held waiting to be merged.
+    keep_tree : bool
+        If False (and ``output_path`` is given), children are written to the
+        output file one source file at a time and no merged tree is kept.
 
     Returns
     -------
-    ElementTree
-        The merged XML tree in memory.
+    ElementTree | None
+        The merged XML tree in memory, or None when ``keep_tree`` is False.
     """
     files = list_xml_files(triggers_dir, filenames=filenames)
     #files = [f for f in files if "merged" not in str(f).lower() and "tree" not in str(f).lower()]
-    files = [f for f in files if any(x in str(f).lower() for x in ['fonds', 'series', 'item', 'file'])]
+    files = [f for f in files if _TRIGGER_KEEP_RE.search(str(f))]
     merged_root = ET.Element(root_tag)
-    print(f"Merging {len(files)} XML files from {triggers_dir or get_triggers_dir()}:")
-    for f in files:
+    if _log.isEnabledFor(logging.INFO):
+        _log.info("Merging %d XML files from %s", len(files), triggers_dir or get_triggers_dir())
+
+    def _parse(f):
+        # files are read through the parser in chunks; handing expat a whole
+        # mmap'd file (fromstring) measured no faster and defeats streaming
         try:
-            tree = ET.parse(f)
-            src_root = tree.getroot()
+            if child_root_tag:
+                return _iter_root_children(f, child_root_tag), None
+            return list(ET.parse(f).getroot()), None
         except Exception as exc:
-            print(f"Warning: skipping '{f}': {exc}")
-            continue
-        # Select children to append
-        children = list(src_root)
-        if child_root_tag:
-            children = [c for c in children if c.tag == child_root_tag]
-        for child in children:
-            # detach & append a shallow copy to avoid cross-tree references
-            merged_root.append(child)
+            return None, exc
+
+    def _parsed_results():
+        """Yield (file, (children, exc)) in file order."""
+        if max_workers <= 1 or len(files) <= 1:
+            for f in files:
+                yield f, _parse(f)
+            return
+        # a sliding window of futures in file order: each result is merged and
+        # released before another file is started, so memory stays bounded
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            remaining = iter(files)
+            pending = deque((f, pool.submit(_parse, f)) for f in itertools.islice(remaining, max_workers))
+            while pending:
+                f, future = pending.popleft()
+                for nxt in itertools.islice(remaining, 1):
+                    pending.append((nxt, pool.submit(_parse, nxt)))
+                result = future.result()
+                del future
+                yield f, result
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _parsed_children():
+        for f, (children, exc) in _parsed_results():
+            if exc is not None:
+                _log.warning("Skipping '%s': %s", f, exc)
+                continue
+            yield from children
+
+    if output_path and not keep_tree:
+        out = Path(output_path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        written = _write_merged_xml(out, root_tag, _parsed_children())
+        _log.info("Merged %d XML files into root <%s> with %d children", len(files), root_tag, written)
+        return None
+
+    merged_root.extend(_parsed_children())
     merged_tree = ET.ElementTree(merged_root)
     if output_path:
         out = Path(output_path)
         out.parent.mkdir(parents=True, exist_ok=True)
         merged_tree.write(out, encoding="utf-8", xml_declaration=True)
-    print(f"Merged {len(files)} XML files into root <{root_tag}> with {len(merged_root)} children.")
+    _log.info("Merged %d XML files into root <%s> with %d children", len(files), root_tag, len(merged_root))
     return merged_tree
 
 
 __all__ = [
-    "set_project_root",
+    "ensure_env_loaded",
     "find_key",
+    "dumps_json",
+    "loads_json",
     "log_timing",
     "get_triggers_dir",
     "list_xml_files",
     "merge_xml_files",
 ]
 
+def dumps_json(obj, indent: bool = True) -> bytes:
+    """Serialise `obj` to UTF-8 JSON bytes.
+
+    Uses orjson when installed, otherwise ``json.dumps(obj, ensure_ascii=False,
+    indent=2)`` (or its compact form when `indent` is False). The two agree on
+    structure and strings, but orjson may spell floats differently (``1e16``
+    rather than ``1e+16``). Anything orjson cannot encode (e.g. integers wider
+    than 64 bits), or would write as ``null`` (NaN/Infinity), goes through the
+    stdlib instead so no value is lost.
+    """
+    if orjson is not None:
+        try:
+            out = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            out = None
+        if out is not None and not (b"null" in out and _has_non_finite_float(obj)):
+            return out
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _has_non_finite_float(obj) -> bool:
+    """True if any float nested in `obj` is NaN or infinite."""
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, float):
+            if not math.isfinite(current):
+                return True
+        elif isinstance(current, dict):
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple)):
+            stack.extend(current)
+    return False
+
+
+def loads_json(raw: Union[bytes, str]):
+    """Parse JSON from UTF-8 bytes or a string, preferring orjson when installed.
+
+    Documents orjson rejects but the stdlib accepts (NaN/Infinity literals,
+    very large integers) are retried with json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    return json.loads(raw)
+
+
 def _load_json_file(path: Optional[str], logger) -> dict:
     """Load JSON from a file path or from a JSON string stored in an env var.
     Returns an empty dict on error or when no input provided.
@@ -301,23 +539,86 @@ def _load_json_file(path: Optional[str], logger) -> dict:
 
     s = str(path).strip()
 
+    # 0) Inline JSON (the usual env-var form) is parsed without touching the
+    #    filesystem; only if that fails is the text tried as a file name
+    if s[:1] in ('{', '['):
+        try:
+            return loads_json(s)
+        except Exception:
+            pass
+
     # 1) If it looks like an existing file (absolute or relative), load it
     p = Path(s)
     if p.exists():
         try:
-            with p.open("r", encoding="utf-8") as fh:
-                return json.load(fh)
+            return loads_json(p.read_bytes())
         except Exception:
             logger.exception("Error reading JSON file %s", p)
             return {}
 
     # 3) Finally, try parsing the string itself as JSON content
     try:
-        return json.loads(s)
+        return loads_json(s)
     except Exception:
         logger.exception("TRANS_CONFIG value is not a valid JSON string or file: %s", s[:200])
         return {}
 
+def _alt_number_matches(record: ET.Element, target_iaid: str) -> bool:
+    """True if any alternative_number under `record` has the text `target_iaid`."""
+    for alt_num in record.iter('alternative_number'):
+        if alt_num.text and alt_num.text.strip() == target_iaid:
+            return True
+    return False
+
+
+def _find_record_by_alt_number(xml_path: Path, target_iaid: str, logger):
+    """Stream `xml_path` and return (root, record) for the first matching <record>, or None.
+
+    "First" is document (start-tag) order below the root, as with
+    ``root.findall('.//record')``: if the match is nested inside other records,
+    the outermost of them is returned. Parsing stops once that record and its
+    tail text are complete, and earlier top-level records are dropped from the
+    tree as they close so only one is held in memory at a time.
+    """
+    root = None
+    path = []           # open elements, root first
+    open_records = 0    # records among `path`, excluding the root
+    found = None
+    for event, elem in ET.iterparse(str(xml_path), events=("start", "end")):
+        if found is not None:
+            # one more event so the record's tail text has been read
+            break
+        if event == "start":
+            if root is None:
+                root = elem
+            elif elem.tag == 'record':
+                open_records += 1
+            path.append(elem)
+            continue
+        path.pop()
+        if elem is root or elem.tag != 'record':
+            continue
+        open_records -= 1
+        if open_records:
+            # an enclosing record comes first in document order and contains
+            # this one; it is checked (and matches if this did) when it closes
+            continue
+        if _alt_number_matches(elem, target_iaid):
+            found = elem
+        else:
+            path[-1].remove(elem)
+    if found is None:
+        return None
+
+    # Look for alternative_number with type='CALM RecordID'
+    alt_num_elem = found.find("Alternative_number/[alternative_number.type='CALM RecordID']/alternative_number")
+    if alt_num_elem is not None and alt_num_elem.text and alt_num_elem.text.strip() == target_iaid:
+        logger.info("Found record with alternative_number %s", target_iaid)
+    else:
+        logger.info("Found record with alternative_number %s (fallback search)", target_iaid)
+    return root, found
+
+
 def filter_xml_by_iaid(xml_path: Union[str, Path], target_iaid: str, output_path: Union[str, Path], logger) -> Path:
     """Filter XML to only include the record with specified citableReference.
 
@@ -342,32 +643,11 @@ def filter_xml_by_iaid(xml_path: Union[str, Path], target_iaid: str, output_path
 
     logger.info("Filtering XML for alternative_number: %s", target_iaid)
 
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    # Find all record elements (not InformationObject - that's the root container)
-    found_record = None
-    for record in root.findall('.//record'):
-        # Look for alternative_number with type='CALM RecordID'
-        alt_num_elem = record.find("Alternative_number/[alternative_number.type='CALM RecordID']/alternative_number")
-        if alt_num_elem is not None and alt_num_elem.text and alt_num_elem.text.strip() == target_iaid:
-            found_record = record
-            logger.info("Found record with alternative_number %s", target_iaid)
-            break
-
-        # Also try without the type filter (in case structure varies)
-        if found_record is None:
-            for alt_num in record.findall('.//alternative_number'):
-                if alt_num.text and alt_num.text.strip() == target_iaid:
-                    found_record = record
-                    logger.info("Found record with alternative_number %s (fallback search)", target_iaid)
-                    break
-            if found_record is not None:
-                break
-
-    if found_record is None:
+    match = _find_record_by_alt_number(xml_path, target_iaid, logger)
+    if match is None:
         logger.warning("Record with alternative_number %s not found in XML file", target_iaid)
         raise ValueError(f"Record with alternative_number {target_iaid} not found in {xml_path}")
+    root, found_record = match
 
     # Create new XML with just this record
     new_root = ET.Element(root.tag, attrib=root.attrib)
@@ -384,27 +664,52 @@ def filter_xml_by_iaid(xml_path: Union[str, Path], target_iaid: str, output_path
 ############################
 # transfer register helpers
 ############################
+# digest of each register's content (bar its save stamps) as last loaded or
+# saved in this process, keyed by "bucket/key"; lets an unchanged register skip
+# the backup copy and upload
+_REGISTER_DIGESTS = {}
+# registers larger than this are uploaded in parallel multipart chunks of this size
+_REGISTER_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+
+def _register_digest(register) -> bytes:
+    """Hash the register content, ignoring the fields stamped on every save."""
+    content = {k: v for k, v in register.items() if k not in ('last_updated', 'total_records')}
+    return hashlib.blake2b(dumps_json(content, indent=False), digest_size=16).digest()
+
+
 def load_transfer_register(register_filename, s3, bucket, s3_output_folder, logger):
     """Load the transfer register (previously called manifest) from S3."""
     key = f"{s3_output_folder}/{register_filename}"
     try:
         response = s3.get_object(Bucket=bucket, Key=key)
-        register = json.loads(response['Body'].read().decode('utf-8'))
+        register = loads_json(response['Body'].read())
         logger.info("Loaded transfer register with %d records", len(register.get('records', {})))
+        _REGISTER_DIGESTS[f"{bucket}/{key}"] = _register_digest(register)
         return register
     except s3.exceptions.NoSuchKey:
         logger.info("Transfer register file not found, creating new one")
+        _REGISTER_DIGESTS.pop(f"{bucket}/{key}", None)
         return {"last_updated": None, "total_records": 0, "records": {}}
     except Exception as e:
         logger.exception("Error loading transfer register: %s", e)
+        _REGISTER_DIGESTS.pop(f"{bucket}/{key}", None)
         return {"last_updated": None, "total_records": 0, "records": {}}
 
-def save_transfer_register(register_filename, s3, bucket, output_dir, register, logger):
-    """Save the transfer register to S3 with a timestamped backup of existing (backward compatible with manifest)."""
+def save_transfer_register(register_filename, s3, bucket, output_dir, register, logger, indent: bool = False):
+    """Save the transfer register to S3 with a timestamped backup of existing (backward compatible with manifest).
+
+    The register is written as compact JSON; pass indent=True for a human-readable copy.
+    """
     key = f"{output_dir}/{register_filename}"
     try:
+        digest = _register_digest(register)
+        if _REGISTER_DIGESTS.get(f"{bucket}/{key}") == digest:
+            logger.info("Transfer register s3://%s/%s unchanged, skipping upload", bucket, key)
+            return
+        # copy straight away rather than checking with head_object first; a
+        # missing register makes the copy itself fail with NoSuchKey/404
         try:
-            s3.head_object(Bucket=bucket, Key=key)
             timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
             base_name = Path(register_filename).stem
             ext = Path(register_filename).suffix
@@ -413,30 +718,47 @@ def save_transfer_register(register_filename, s3, bucket, output_dir, register,
             s3.copy_object(Bucket=bucket, CopySource={'Bucket': bucket, 'Key': key}, Key=backup_key)
             logger.info("Created backup of existing transfer register: s3://%s/%s", bucket, backup_key)
         except s3.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == '404':
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
                 logger.info("No existing transfer register to backup")
             else:
                 raise
         register['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         register['total_records'] = len(register.get('records', {}))
-        body = json.dumps(register, indent=2, ensure_ascii=False).encode('utf-8')
-        s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+        body = dumps_json(register, indent=indent)
+        if len(body) > _REGISTER_MULTIPART_THRESHOLD:
+            # large registers go up as concurrent multipart chunks
+            from boto3.s3.transfer import TransferConfig
+            config = TransferConfig(multipart_threshold=_REGISTER_MULTIPART_THRESHOLD,
+                                    multipart_chunksize=_REGISTER_MULTIPART_THRESHOLD,
+                                    max_concurrency=8, use_threads=True)
+            s3.upload_fileobj(io.BytesIO(body), bucket, key, Config=config,
+                              ExtraArgs={'ContentType': 'application/json'})
+        else:
+            s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+        _REGISTER_DIGESTS[f"{bucket}/{key}"] = digest
         logger.info("Saved transfer register with %d total records to s3://%s/%s", register['total_records'], bucket, key)
     except Exception as e:
         logger.exception("Error saving transfer register: %s", e)
 
 def filter_new_records(records, transfer_register, logger):
-    """Filter out already-uploaded records using transfer register"""
-    uploaded_iaids = set(transfer_register.get('records', {}).keys())
-    new_records = {}
-    skipped_count = 0
+    """Filter out already-uploaded records using transfer register.
 
-    for iaid, record_data in records.items():
-        if iaid in uploaded_iaids:
-            logger.debug("Skipping already-uploaded record: %s", iaid)
-            skipped_count += 1
-            continue
-        new_records[iaid] = record_data
+    Membership is tested against the register's ``records`` dict itself, so no
+    separate iaid index is built or stored alongside the register.
+    """
+    # the register's records dict gives O(1) membership directly; when nothing
+    # overlaps (first run, new source file) the copy is done in C
+    uploaded = transfer_register.get('records', {})
+    if uploaded and not records.keys().isdisjoint(uploaded):
+        new_records = {iaid: record_data for iaid, record_data in records.items() if iaid not in uploaded}
+    else:
+        new_records = dict(records)
+    skipped_count = len(records) - len(new_records)
+
+    if skipped_count and logger.isEnabledFor(logging.DEBUG):
+        for iaid in records:
+            if iaid in uploaded:
+                logger.debug("Skipping already-uploaded record: %s", iaid)
 
     logger.info("Filtered %d new records (skipped %d duplicates)", len(new_records), skipped_count)
     return new_records
@@ -446,26 +768,36 @@ def update_transfer_register_with_records(transfer_register, records, source_fil
     if 'records' not in transfer_register:
         transfer_register['records'] = {}
 
+    # read each record's level once, remembering it for the insert pass
     max_level = 0
+    levels = []
     for iaid, record_data in records.items():
-        catalogue_level = record_data.get('record', {}).get('catalogueLevel', 0)
+        record = record_data.get('record', {})
+        catalogue_level = record.get('catalogueLevel', 0)
         if catalogue_level > max_level:
             max_level = catalogue_level
+        levels.append((iaid, record, catalogue_level))
 
     logger.info("Tree max catalogue level: %d - tracking all except deepest", max_level)
 
+    register_records = transfer_register['records']
+    uploaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    uploaded_to = f"s3://{bucket}/{s3_output_folder}"
+    # leaf records are usually the majority, so skip the per-record debug call
+    # entirely unless it will be emitted
+    log_skips = logger.isEnabledFor(logging.DEBUG)
     added_count = 0
     skipped_count = 0
-    for iaid, record_data in records.items():
-        catalogue_level = record_data.get('record', {}).get('catalogueLevel', 0)
+    for iaid, record, catalogue_level in levels:
         if catalogue_level == max_level:
-            logger.debug("Skipping leaf record %s (level %d)", iaid, catalogue_level)
+            if log_skips:
+                logger.debug("Skipping leaf record %s (level %d)", iaid, catalogue_level)
             skipped_count += 1
             continue
-        transfer_register['records'][iaid] = {
-            'reference': record_data.get('record', {}).get('citableReference', 'N/A'),
-            'uploaded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'uploaded_to': f"s3://{bucket}/{s3_output_folder}",
+        register_records[iaid] = {
+            'reference': record.get('citableReference', 'N/A'),
+            'uploaded_at': uploaded_at,
+            'uploaded_to': uploaded_to,
             'source_file': source_file,
             'QA_status': {
                 'checked_complete': False,
@@ -0,0 +1,54 @@
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+import src.transformers as transformers
+
+
+class InlineExecutor:
+    """Runs submitted chunks immediately and tracks how many results are waiting."""
+    def __init__(self, max_workers):
+        self.waiting = 0
+        self.max_waiting = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        executor = self
+        real_result = future.result
+
+        def result(timeout=None):
+            executor.waiting -= 1
+            return real_result(timeout)
+        future.result = result
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+def test_convert_to_json_bounds_chunks_in_flight(tmp_path, monkeypatch):
+    xml = tmp_path / "records.xml"
+    xml.write_text("<adlibXML><recordList>" + "".join(
+        f"<record><priref>{i}</priref></record>" for i in range(20)) + "</recordList></adlibXML>", encoding="utf-8")
+    executors = []
+
+    def make_executor(max_workers):
+        executors.append(InlineExecutor(max_workers))
+        return executors[-1]
+
+    def convert_chunk(chunk, remove_empty_fields):
+        return [(ET.fromstring(raw).findtext("priref"), None, {"record": {}}) for raw in chunk]
+
+    monkeypatch.setattr(transformers, "ProcessPoolExecutor", make_executor)
+    monkeypatch.setattr(transformers, "_convert_record_chunk", convert_chunk)
+    records = transformers.convert_to_json(str(xml), str(tmp_path), workers=2, chunk_size=2)
+
+    assert list(records) == [str(i) for i in range(20)]
+    # ten chunks are submitted, but never more than two per worker wait to be stored
+    assert executors[0].max_waiting == 4
@@ -0,0 +1,18 @@
+import logging
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+from src.transformers import NewlineToPTransformer
+
+
+def test_malformed_target_columns_are_skipped(caplog):
+    with caplog.at_level(logging.WARNING, logger="pipeline.transformers.newline_to_p"):
+        t = NewlineToPTransformer(target_columns=["title", "notes[x]", "parts[0][1]"])
+    assert len(caplog.records) == 2
+
+    record = {"record": {"title": "a\nb", "notes": ["c\nd"], "parts": ["e\nf"]}}
+    out = t.transform(record)
+    assert out == {"record": {"title": "a<p>b", "notes": ["c\nd"], "parts": ["e\nf"]}}
+    assert record["record"]["title"] == "a\nb"
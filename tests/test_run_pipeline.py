@@ -0,0 +1,45 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+import src.utils as utils
+
+ENV_KEYS = ("RUN_MODE", "CONVERT_WORKERS", "TRANSFER_REGISTER_FILENAME",
+            "AWS_LAMBDA_FUNCTION_NAME", "AWS_EXECUTION_ENV")
+
+
+@pytest.fixture()
+def env_dir(tmp_path, monkeypatch):
+    """Run from an empty directory with a clean environment and a fresh run_pipeline import."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delitem(sys.modules, "run_pipeline", raising=False)
+    utils.ensure_env_loaded.cache_clear()
+    with mock.patch.dict(os.environ):
+        for key in ENV_KEYS:
+            os.environ.pop(key, None)
+        yield tmp_path
+    sys.modules.pop("run_pipeline", None)
+    utils.ensure_env_loaded.cache_clear()
+
+
+def test_run_pipeline_reads_dotenv_before_module_settings(env_dir):
+    (env_dir / ".env").write_text(
+        "RUN_MODE=remote_s3\nCONVERT_WORKERS=3\nTRANSFER_REGISTER_FILENAME=custom_register.json\n",
+        encoding="utf-8",
+    )
+    run_pipeline = importlib.import_module("run_pipeline")
+    assert run_pipeline.run_mode == "remote_s3"
+    assert run_pipeline.CONVERT_WORKERS == 3
+    assert run_pipeline.transfer_register_filename == "custom_register.json"
+
+
+def test_run_pipeline_rejects_invalid_run_mode_from_dotenv(env_dir):
+    (env_dir / ".env").write_text("RUN_MODE=bogus_mode\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Invalid RUN_MODE 'bogus_mode'"):
+        importlib.import_module("run_pipeline")
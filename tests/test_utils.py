@@ -0,0 +1,184 @@
+import json
+import logging
+import types
+import xml.etree.ElementTree as ET
+from pathlib import Path
+import sys
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+from src.utils import filter_xml_by_iaid, find_key, update_transfer_register_with_records
+from src.utils import load_transfer_register, save_transfer_register
+import src.utils as utils
+
+LOGGER = logging.getLogger("tests.utils")
+
+
+class DummyBody:
+    def __init__(self, payload: bytes):
+        self._payload = payload
+    def read(self):
+        return self._payload
+
+
+class DummyS3Client:
+    """Minimal in-memory stand-in for the S3 calls the register helpers make."""
+    def __init__(self, objects=None):
+        from botocore.exceptions import ClientError
+        self.exceptions = types.SimpleNamespace(ClientError=ClientError, NoSuchKey=type("NoSuchKey", (ClientError,), {}))
+        self.objects = dict(objects or {})
+        self.calls = []
+    def get_object(self, Bucket, Key):
+        self.calls.append("get_object")
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': DummyBody(self.objects[Key])}
+    def copy_object(self, Bucket, CopySource, Key):
+        self.calls.append("copy_object")
+        if CopySource['Key'] not in self.objects:
+            raise self.exceptions.ClientError({'Error': {'Code': 'NoSuchKey'}}, 'CopyObject')
+        self.objects[Key] = self.objects[CopySource['Key']]
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append("put_object")
+        self.objects[Key] = Body
+
+SAMPLE_XML = """<?xml version='1.0' encoding='utf-8'?>
+<adlibXML>
+  <recordList>
+    <record><Alternative_number><alternative_number.type>CALM RecordID</alternative_number.type><alternative_number>C1</alternative_number></Alternative_number></record>
+    <record><title>outer</title>
+      <record><alternative_number> C2 </alternative_number></record>
+    </record>
+    <record><Alternative_number><alternative_number.type>CALM RecordID</alternative_number.type><alternative_number>C2</alternative_number></Alternative_number></record>
+  </recordList>
+</adlibXML>
+"""
+
+
+@pytest.fixture()
+def sample_xml(tmp_path):
+    path = tmp_path / "sample.xml"
+    path.write_text(SAMPLE_XML, encoding="utf-8")
+    return path
+
+
+def test_filter_xml_by_iaid_typed_match(sample_xml, tmp_path):
+    out = filter_xml_by_iaid(sample_xml, "C1", tmp_path / "out" / "filtered.xml", LOGGER)
+    root = ET.parse(out).getroot()
+    assert root.tag == "adlibXML"
+    assert [r.findtext(".//alternative_number") for r in root] == ["C1"]
+
+
+def test_filter_xml_by_iaid_first_record_in_document_order(sample_xml, tmp_path):
+    # the nested record matches first, so its enclosing record is the result
+    out = filter_xml_by_iaid(sample_xml, "C2", tmp_path / "filtered.xml", LOGGER)
+    (record,) = list(ET.parse(out).getroot())
+    assert record.findtext("title") == "outer"
+    assert record.find("record") is not None
+
+
+def test_filter_xml_by_iaid_earlier_untyped_match_wins(sample_xml, tmp_path, caplog):
+    # a later record has a typed CALM RecordID match for C2, but the earlier
+    # record's untyped alternative_number still takes precedence
+    with caplog.at_level(logging.INFO, logger=LOGGER.name):
+        filter_xml_by_iaid(sample_xml, "C2", tmp_path / "filtered.xml", LOGGER)
+    assert "Found record with alternative_number C2 (fallback search)" in caplog.messages
+
+
+def test_filter_xml_by_iaid_missing(sample_xml, tmp_path):
+    with pytest.raises(ValueError):
+        filter_xml_by_iaid(sample_xml, "C9", tmp_path / "filtered.xml", LOGGER)
+
+
+def test_update_transfer_register_skips_deepest_level():
+    records = {
+        "A1": {"record": {"catalogueLevel": 1, "citableReference": "PARL/1"}},
+        "A2": {"record": {"catalogueLevel": 3, "citableReference": "PARL/1/1/1"}},
+        "A3": {"record": {"catalogueLevel": 2}},
+        "A4": {},
+    }
+    register = update_transfer_register_with_records({}, records, "src.xml", "bucket", "out", LOGGER)
+
+    assert list(register["records"]) == ["A1", "A3", "A4"]
+    assert register["records"]["A1"]["reference"] == "PARL/1"
+    assert register["records"]["A3"]["reference"] == "N/A"
+    assert register["records"]["A4"]["catalogue_level"] == 0
+    assert register["records"]["A1"]["uploaded_to"] == "s3://bucket/out"
+    # entries must not share their nested QA status dicts
+    assert register["records"]["A1"]["QA_status"] is not register["records"]["A3"]["QA_status"]
+
+
+def test_save_transfer_register_skips_unchanged_register():
+    stored = {"last_updated": "2025-01-01 00:00:00", "total_records": 1, "records": {"A1": {"reference": "PARL/1"}}}
+    s3 = DummyS3Client({"out/register.json": json.dumps(stored).encode("utf-8")})
+    register = load_transfer_register("register.json", s3, "bucket", "out", LOGGER)
+
+    save_transfer_register("register.json", s3, "bucket", "out", register, LOGGER)
+    assert s3.calls == ["get_object"]
+
+    register["records"]["A2"] = {"reference": "PARL/2"}
+    save_transfer_register("register.json", s3, "bucket", "out", register, LOGGER)
+    assert s3.calls == ["get_object", "copy_object", "put_object"]
+    assert set(json.loads(s3.objects["out/register.json"])["records"]) == {"A1", "A2"}
+
+
+def test_find_key_yields_in_document_order():
+    doc = {
+        "a": {"level": 1, "b": [{"level": 2}, {"c": {"level": 3}}]},
+        "level": 4,
+        "d": [[{"level": 5}], "level"],
+    }
+    # a nested hit under an earlier key comes before a later direct hit
+    assert list(find_key(doc, "level")) == [1, 2, 3, 4, 5]
+    assert list(find_key([{"x": {"level": 0}}, {"level": 1}], "level")) == [0, 1]
+    assert list(find_key("level", "level")) == []
+
+
+def test_merge_xml_files_bounds_parsed_files_in_flight(tmp_path, monkeypatch):
+    for i in range(6):
+        (tmp_path / f"series_{i}.xml").write_text(f"<root><rec n='{i}'/></root>", encoding="utf-8")
+    started = []
+    real_iter = utils._iter_root_children
+
+    def tracking_iter(path, tag):
+        started.append(path)
+        return real_iter(path, tag)
+
+    monkeypatch.setattr(utils, "_iter_root_children", tracking_iter)
+    seen = []
+    real_write = utils._write_merged_xml
+
+    def tracking_write(out, root_tag, children):
+        def watch():
+            for child in children:
+                seen.append(len(started))
+                yield child
+        return real_write(out, root_tag, watch())
+
+    monkeypatch.setattr(utils, "_write_merged_xml", tracking_write)
+    out = tmp_path / "merged.xml"
+    utils.merge_xml_files(tmp_path, child_root_tag="rec", output_path=out, max_workers=2, keep_tree=False)
+
+    assert [c.get("n") for c in ET.parse(out).getroot()] == [str(i) for i in range(6)]
+    # while file i is written, at most two files beyond it have been started
+    assert all(n <= i + 3 for i, n in enumerate(seen))
+
+
+def test_dumps_json_keeps_non_finite_floats():
+    data = {"a": float("nan"), "b": [float("inf"), None], "c": 2 ** 70}
+    assert utils.dumps_json(data, indent=False) == json.dumps(data, separators=(",", ":")).encode("utf-8")
+    assert json.loads(utils.dumps_json({"a": None, "b": 1.5})) == {"a": None, "b": 1.5}
+
+
+def test_save_transfer_register_uploads_after_register_disappears():
+    empty = {"last_updated": None, "total_records": 0, "records": {}}
+    s3 = DummyS3Client({"out/register.json": json.dumps(empty).encode("utf-8")})
+    load_transfer_register("register.json", s3, "bucket", "out", LOGGER)
+
+    # the stored register goes away; the fresh empty one must still be written
+    del s3.objects["out/register.json"]
+    register = load_transfer_register("register.json", s3, "bucket", "out", LOGGER)
+    save_transfer_register("register.json", s3, "bucket", "out", register, LOGGER)
+    assert "out/register.json" in s3.objects
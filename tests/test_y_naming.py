@@ -1,6 +1,7 @@
 import pytest
 
 import sys, os
+import math
 
 # Add project root to PYTHONPATH so 'src' can be imported when running pytest from repo root.
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -99,3 +100,24 @@ def test_whitespace_embedded_cases():
     # Embedded transformation behavior
     assert t.apply_if_reference("ABC/1 DEF") == "YABC/1 DEF"
     assert t.apply_if_reference("ABC/1/ DEF") == "ABC/1/ DEF"
+
+
+def test_dataframe_target_columns():
+    pd = pytest.importorskip("pandas")
+    t = YNamingTransformer(target_columns=["record.reference"])
+    df = pd.DataFrame({"reference": ["ABC/1", "PARL/2", None], "title": ["ABC/3", "x", "y"]})
+    out = t.transform(df)
+    assert out["reference"].tolist() == ["YABC/1", "YUKP/2", None]
+    assert out["title"].tolist() == ["ABC/3", "x", "y"]  # not a target column
+    assert df["reference"].tolist() == ["ABC/1", "PARL/2", None]  # input left untouched
+
+
+def test_transform_copy_keeps_non_json_values():
+    t = YNamingTransformer()
+    data = {"record": {"ref": "ABC/1", "score": float("nan"), "span": (1, 2)}}
+    out = t.transform(data)
+    assert out["record"]["ref"] == "YABC/1"
+    assert math.isnan(out["record"]["score"])
+    assert out["record"]["span"] == (1, 2)
+    assert data["record"]["ref"] == "ABC/1"  # input left untouched
+    assert t.transform({"record": {3: "ABC/1"}}) == {"record": {3: "YABC/1"}}